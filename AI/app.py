@@ -1,62 +1,138 @@
 import os
+import time
+import uuid
 import logging
 import traceback
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
+from utilities.logging_setup import configure_logging, request_id_var
+from utilities.metrics import CONTENT_TYPE, REGISTRY, Counter, Histogram
 
-# Configure basic logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('agroboost_ai.log')  # Log to file as well
-    ]
-)
+# Log through a queue to a background thread that writes JSON lines to the console and agroboost_ai.log
+configure_logging()
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-
-@app.route('/')
-def home():
-    return "AgroBoost API is running"
-
-@app.errorhandler(404)
-def page_not_found(e):
-    return jsonify({"error": "Route not found"}), 404
-
-@app.errorhandler(500)
-def internal_server_error(e):
-    return jsonify({"error": "Internal server error"}), 500
-
-try:
-    # Check if routes directory exists
-    if not os.path.exists(os.path.join(os.path.dirname(__file__), 'routes')):
-        logger.error("routes directory is missing")
-        raise FileNotFoundError("routes directory not found")
-    
-    # Import API blueprint
-    from routes.api import api_bp
-    
-    # Register API routes
-    app.register_blueprint(api_bp, url_prefix="/api")
-    logger.info("API routes registered successfully")
-    
-except ImportError as e:
-    logger.error(f"Import error: {e}")
-    logger.error(traceback.format_exc())
-    # Don't raise here, let the app continue with limited functionality
-except Exception as e:
-    logger.error(f"Setup error: {e}")
-    logger.error(traceback.format_exc())
-    # Don't raise here, let the app continue with limited functionality
+HTTP_REQUESTS = Counter('http_requests_total', "HTTP requests by route, method and status.",
+                        ('route', 'method', 'status'))
+HTTP_LATENCY = Histogram('http_request_duration_seconds', "HTTP request latency by route.",
+                         ('route', 'method'))
+
+
+def create_app():
+    """Build the Flask app and load the API routes along with their state.
+
+    If the routes fail to load, the app still starts so that /healthz can
+    answer, but /readyz reports the failure with a 503 so the instance is
+    kept out of rotation.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
+    app.config['READY'] = False
+    app.config['STARTUP_ERROR'] = None
+
+    # Keep uploads in memory, bounded by the request size cap
+    try:
+        from utilities.image_intake import MAX_UPLOAD_BYTES, InMemoryUploadRequest
+        app.request_class = InMemoryUploadRequest
+        app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024  # room for the form fields
+    except ImportError as e:
+        logger.error("Import error: %s", e)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        # Tag every log record of this request; honour an id set by a proxy or the caller
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex[:16]
+        g.request_id_token = request_id_var.set(g.request_id)
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # The rule pattern, not the path, keeps the number of series bounded
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    @app.teardown_request
+    def clear_request_id(exc):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    @app.route('/')
+    def home():
+        return "AgroBoost API is running"
+
+    @app.route('/healthz')
+    def healthz():
+        # Liveness: the process is up and serving requests
+        return jsonify({"status": "ok"}), 200
+
+    @app.route('/readyz')
+    def readyz():
+        # Readiness: the API routes and their state loaded
+        if app.config['READY']:
+            return jsonify({"status": "ready"}), 200
+        return jsonify({"status": "unavailable", "error": app.config['STARTUP_ERROR']}), 503
+
+    @app.errorhandler(404)
+    def page_not_found(e):
+        return jsonify({"error": "Route not found"}), 404
+
+    @app.errorhandler(500)
+    def internal_server_error(e):
+        return jsonify({"error": "Internal server error"}), 500
+
+    try:
+        # Check if routes directory exists
+        if not os.path.exists(os.path.join(os.path.dirname(__file__), 'routes')):
+            logger.error("routes directory is missing")
+            raise FileNotFoundError("routes directory not found")
+        
+        # Import API blueprint; this also builds the schemes index and search index
+        from routes.api import api_bp
+        
+        # Register API routes
+        app.register_blueprint(api_bp, url_prefix="/api")
+        logger.info("API routes registered successfully")
+        
+        # Heavy SDKs load on first use; AI_WARMUP=1 loads them before traffic arrives
+        if os.environ.get('AI_WARMUP', '0') == '1':
+            from models.model import warmup
+            warmup()
+        app.config['READY'] = True
+        
+    except Exception as e:
+        logger.error("Setup error: %s", e)
+        logger.error(traceback.format_exc())
+        # Keep serving liveness checks, but report not ready
+        app.config['STARTUP_ERROR'] = f"{type(e).__name__}: {e}"
+
+    # On-demand profiling endpoints and per-request profiles; off by default (see routes/debug.py)
+    if os.environ.get('AI_PROFILING_ENABLED', '0') == '1':
+        from routes.debug import debug_bp
+        app.register_blueprint(debug_bp, url_prefix="/debug")
+        logger.warning("Profiling is enabled (token %s)", "required" if os.environ.get('AI_PROFILING_TOKEN') else "not set")
+
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
     try:
-        logger.info("Starting Flask application...")
+        logger.info("Starting Flask development server...")
+        # Development only; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
         # Bind to all interfaces (0.0.0.0) to allow external connections
         app.run(debug=True, use_reloader=True, host='0.0.0.0', port=5000)
     except Exception as e:
-        logger.error(f"Application error: {e}")
+        logger.error("Application error: %s", e)
         logger.error(traceback.format_exc())
\ No newline at end of file
@@ -1,4 +1,6 @@
-MONGO_URI = "mongodb://localhost:27017/"
-DATABASE_NAME = "image_analysis"
+import os
+
+MONGO_URI = os.environ.get('MONGO_URI', "mongodb://localhost:27017/")
+DATABASE_NAME = os.environ.get('MONGO_DATABASE', "image_analysis")
 COLLECTION_NAME = "image_responses"
 MODEL_NAME = "Salesforce/blip2-opt-2.7b"
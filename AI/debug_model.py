@@ -2,15 +2,10 @@ import os
 import logging
 import sys
 
+from utilities.logging_setup import configure_logging
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('model_debug.log')
-    ]
-)
+configure_logging(log_file='model_debug.log', console_format='text')
 logger = logging.getLogger(__name__)
 
 def main():
@@ -19,31 +14,32 @@ def main():
     try:
         # Import and check if the packages are installed
         try:
-            import torch
-            logger.info(f"PyTorch version: {torch.__version__}")
-            logger.info(f"CUDA available: {torch.cuda.is_available()}")
-            if torch.cuda.is_available():
-                logger.info(f"CUDA device: {torch.cuda.get_device_name(0)}")
+            from google import genai
+            logger.info("google-genai version: %s", genai.__version__)
         except ImportError:
-            logger.error("PyTorch not installed")
+            logger.error("google-genai not installed")
         
         try:
-            import transformers
-            logger.info(f"Transformers version: {transformers.__version__}")
+            import pydantic
+            logger.info("Pydantic version: %s", pydantic.VERSION)
         except ImportError:
-            logger.error("Transformers not installed")
+            logger.error("Pydantic not installed")
+        
+        if not os.environ.get("GOOGLE_API_KEY"):
+            logger.error("GOOGLE_API_KEY is not set")
         
-        # Try to import our model module
+        # Try to import our model module and set up the Gemini client
         logger.info("Attempting to import model module...")
-        from models.model import processor, model
+        from models.model import GEMINI_MODEL, warmup, get_client
         
-        if model is None or processor is None:
-            logger.error("Model or processor is None")
+        warmup()
+        if get_client() is None:
+            logger.error("Gemini client is None")
         else:
-            logger.info("Model and processor loaded successfully!")
+            logger.info("Gemini client ready for %s", GEMINI_MODEL)
             
     except Exception as e:
-        logger.error(f"Error in debug script: {e}")
+        logger.error("Error in debug script: %s", e)
         logger.exception("Exception details:")
 
 if __name__ == "__main__":
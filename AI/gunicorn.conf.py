@@ -0,0 +1,58 @@
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Graceful restarts:
+#   kill -HUP <master>   start new workers, then retire the old ones once their
+#                        in-flight requests finish (within graceful_timeout)
+#   kill -USR2 <master>  then -QUIT to the old master, for a new code version;
+#                        with preload_app, HUP alone reuses the loaded code
+import os
+import multiprocessing
+
+bind = os.environ.get('AI_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('AI_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Requests mostly wait on Gemini, so each worker serves several at once
+worker_class = 'gthread'
+threads = int(os.environ.get('AI_THREADS', 4))
+
+# Load the app in the master and fork the workers from it, with the Gemini
+# SDK imported up front so the workers share it instead of each importing it
+preload_app = True
+os.environ.setdefault('AI_WARMUP', '1')
+
+# Longer than a Gemini call may take (GEMINI_TIMEOUT) so workers aren't killed mid-request
+timeout = int(os.environ.get('AI_WORKER_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('AI_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('AI_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth; 0 disables
+max_requests = int(os.environ.get('AI_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('AI_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('AI_ACCESS_LOG', '-')
+errorlog = '-'
+# Application logs go to the console only, next to gunicorn's own; a file set
+# with AI_LOG_FILE is split per worker (see utilities/logging_setup.py)
+os.environ.setdefault('AI_LOG_FILE', '')
+
+
+def when_ready(server):
+    from wsgi import app
+    if not app.config['READY']:
+        server.log.error("API routes failed to load; /readyz will report 503: %s", app.config['STARTUP_ERROR'])
+
+
+def post_fork(server, worker):
+    # The Gemini client and its executor notice the new pid and are created
+    # per worker on first use, so no sockets or threads are shared with the master
+    server.log.info("Worker spawned (pid: %s)", worker.pid)
+    # Resume queued async signups right away instead of on the first request
+    try:
+        from routes.api import signup_jobs
+        if signup_jobs is not None:
+            signup_jobs.start()
+    except ImportError:
+        pass
+    # Join profiling sessions even while this worker gets no requests
+    if os.environ.get('AI_PROFILING_ENABLED', '0') == '1':
+        from routes.debug import sessions
+        sessions.watch()
@@ -1,9 +1,10 @@
+import hashlib
 import logging
 import os
+import threading
 import traceback
-from google import genai
-from google.genai import types # type: ignore
-from pydantic import BaseModel
+from utilities.resilience import BoundedExecutor, CircuitBreaker, Overloaded
+from utilities.result_cache import SingleFlightCache
 # Configure more detailed logging
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ def check_system_resources():
         disk_info = psutil.disk_usage(os.path.dirname(__file__))
         available_disk_gb = disk_info.free / (1024 ** 3)
         
-        logger.info(f"System resources: {available_memory_gb:.2f} GB RAM available, {available_disk_gb:.2f} GB disk space available")
+        logger.info("System resources: %.2f GB RAM available, %.2f GB disk space available", available_memory_gb, available_disk_gb)
         
         if available_memory_gb < 4:
             logger.warning("Less than 4GB of RAM available, model loading may fail")
@@ -28,30 +29,168 @@ def check_system_resources():
             
         return True
     except Exception as e:
-        logger.warning(f"Failed to check system resources: {e}")
+        logger.warning("Failed to check system resources: %s", e)
         return True  # Continue anyway
 
-# Function to extract text from an image using Tesseract OCR
-def extract_text_from_image(image_path, prompt):
+# Settings for calls to Gemini
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash')
+# Seconds a single extraction may take, including time spent waiting for a slot
+GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', 30))
+GEMINI_MAX_IN_FLIGHT = int(os.environ.get('GEMINI_MAX_IN_FLIGHT', 4))
+GEMINI_MAX_QUEUED = int(os.environ.get('GEMINI_MAX_QUEUED', 16))
+# Open the breaker when this share of the calls in the window fail
+GEMINI_BREAKER_THRESHOLD = float(os.environ.get('GEMINI_BREAKER_THRESHOLD', 0.5))
+GEMINI_BREAKER_MIN_CALLS = int(os.environ.get('GEMINI_BREAKER_MIN_CALLS', 10))
+GEMINI_BREAKER_WINDOW = float(os.environ.get('GEMINI_BREAKER_WINDOW', 60))
+GEMINI_BREAKER_RESET = float(os.environ.get('GEMINI_BREAKER_RESET', 30))
+# Extraction results kept per image hash, in memory only (0 disables)
+EXTRACTION_CACHE_SIZE = int(os.environ.get('EXTRACTION_CACHE_SIZE', 256))
+EXTRACTION_CACHE_TTL = float(os.environ.get('EXTRACTION_CACHE_TTL', 600))
+
+
+class UpstreamUnavailable(Exception):
+    """Gemini is not being called right now: the breaker is open or all slots are taken."""
+
+
+# The Gemini SDK and pydantic are imported on first use (see _sdk), so routes
+# that never call Gemini, like /api/schemes, don't pay for loading them
+_genai = None
+_types = None
+_response_config = None
+_sdk_lock = threading.Lock()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+executor = BoundedExecutor(GEMINI_MAX_IN_FLIGHT, GEMINI_MAX_QUEUED)
+breaker = CircuitBreaker(GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_MIN_CALLS,
+                         GEMINI_BREAKER_WINDOW, GEMINI_BREAKER_RESET)
+# Retried uploads of the same image reuse one model call
+extraction_cache = SingleFlightCache(EXTRACTION_CACHE_SIZE, EXTRACTION_CACHE_TTL)
+
+
+def _sdk():
+    """Import the Gemini SDK and build the response schema, once per process."""
+    global _genai, _types, _response_config
+    if _response_config is None:
+        with _sdk_lock:
+            if _response_config is None:
+                from google import genai
+                from google.genai import types # type: ignore
+                from pydantic import BaseModel
+
+                class AadhaarDetails(BaseModel):
+                    name :str
+                    aadharID :str
+                    dob :str
+                    location :str
+
+                _genai, _types = genai, types
+                _response_config = types.GenerateContentConfig(
+                    response_mime_type='application/json',
+                    response_schema=list[AadhaarDetails],
+                )
+    return _genai, _types, _response_config
+
+
+def warmup():
+    """Pay the SDK import and client setup cost before the first signup arrives."""
+    _sdk()
+    if os.environ.get("GOOGLE_API_KEY"):
+        get_client()
+    logger.info("Gemini client warmed up")
+
+
+def get_client():
+    """Return the process-wide Gemini client, creating it on first use.
+
+    The client keeps its HTTP connections open between calls. A forked worker
+    gets its own client rather than sharing the parent's sockets.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        genai, types, _ = _sdk()
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = genai.Client(
+                    api_key=os.environ["GOOGLE_API_KEY"],
+                    # Milliseconds; bounds the worker thread even after the caller gave up
+                    http_options=types.HttpOptions(timeout=int(GEMINI_TIMEOUT * 1000)),
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def set_client(client):
+    """Use ``client`` for all calls in this process, e.g. a local fake; None resets it."""
+    global _client, _client_pid
+    with _client_lock:
+        _client = client
+        _client_pid = os.getpid() if client is not None else None
+
+
+def _generate(prompt, image):
+    _, _, response_config = _sdk()
+    response = get_client().models.generate_content(model=GEMINI_MODEL, contents=[prompt, image], config=response_config)
+    # The full response object is large and holds identity data; log only its size
+    logger.debug("Gemini response: %d chars", len(response.text or ''))
+    return response.text
+
+
+def client_stats():
+    return {"breaker": breaker.stats(), "executor": executor.stats(), "cache": extraction_cache.stats()}
+
+
+def image_key(image_bytes, prompt):
+    """Cache key for an extraction: a hash of the model, prompt and normalized image bytes."""
+    digest = hashlib.sha256()
+    for part in (GEMINI_MODEL.encode('utf-8'), prompt.encode('utf-8'), bytes(image_bytes)):
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+# Function to extract the Aadhaar details from an image with Gemini
+def extract_text_from_image(image, prompt):
+    """``image`` is encoded JPEG bytes (see utilities/image_intake.py) or a path to an image file.
+
+    Returns the model's JSON text, or None if the call failed. Raises
+    UpstreamUnavailable without calling Gemini when the circuit breaker is
+    open or too many calls are already running and queued.
+
+    Results for image bytes are cached by content hash, and concurrent calls
+    for the same bytes share one model call.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        text, source = extraction_cache.get_or_compute(
+            image_key(image, prompt), lambda: _extract(image, prompt)
+        )
+        logger.debug("Extraction cache %s", source)
+        return text
+    return _extract(image, prompt)
+
+
+def _extract(image, prompt):
+    if not breaker.allow():
+        raise UpstreamUnavailable("Gemini circuit breaker is open")
     try:
-        
-        import PIL.Image
-        class schema(BaseModel):
-            name :str
-            aadharID :str
-            dob :str
-            location :str
-        
-        
-        image = PIL.Image.open(image_path)
-        client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
-        response = client.models.generate_content(model="gemini-2.0-flash", contents=[prompt, image],config={
-        'response_mime_type': 'application/json',
-        'response_schema': list[schema],
-    },)
-        logger.info(f"Response: {response}")
-        return response.text
+        if isinstance(image, (bytes, bytearray)):
+            # Already encoded: hand the bytes over as-is instead of re-encoding a PIL image
+            _, types, _ = _sdk()
+            image = types.Part.from_bytes(data=bytes(image), mime_type='image/jpeg')
+        else:
+            import PIL.Image
+            image = PIL.Image.open(image)
+        text = executor.run(_generate, prompt, image, timeout=GEMINI_TIMEOUT)
+    except Overloaded as e:
+        # Not the upstream's fault; a half-open probe may be retried by the next call
+        breaker.release_probe()
+        raise UpstreamUnavailable(str(e))
     except Exception as e:
-        logger.error(f"Error extracting text with Tesseract OCR: {e}")
+        breaker.record_failure()
+        logger.error("Error extracting text with Gemini: %s", e)
         logger.error(traceback.format_exc())
         return None
+    breaker.record_success()
+    return text
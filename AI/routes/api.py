@@ -1,42 +1,212 @@
-import json
 import os
-from flask import Blueprint, request, jsonify
+import time
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 import logging
 import traceback
-from models.model import extract_text_from_image
+from models.model import UpstreamUnavailable, client_stats, extract_text_from_image
+from utilities.image_intake import InvalidImage, UploadTooLarge, intake_image
+from utilities.job_queue import JobQueue, QueueFull, RetryableError
+from utilities.metrics import Counter, Gauge, Histogram
+from utilities.persistence import ResultStore, mongo_collection
+from utilities.scheme_index import SchemeIndex
+from utilities.scheme_search import SchemeSearch
 
 
 api_bp = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
 
+STAGE_SECONDS = Histogram('agroboost_stage_duration_seconds', "Time spent in each stage of a request.",
+                          ('route', 'stage'))
+ERRORS = Counter('agroboost_errors_total', "Requests that failed, by route and kind of failure.",
+                 ('route', 'kind'))
+FALLBACKS = Counter('agroboost_fallback_responses_total', "Responses served from a fallback instead of live data.",
+                    ('route',))
+
+# Cleaned schemes are indexed once at startup and rebuilt when schemes.json changes
+scheme_index = SchemeIndex()
+scheme_search = SchemeSearch(scheme_index)
+try:
+    scheme_search.refresh()
+except Exception as e:
+    logger.error("Error building schemes index: %s", e)
+    logger.error(traceback.format_exc())
+
+SIGNUP_PROMPT = "PLease parse this aadhar card image and extract the details as a JSON string, only fetch the name, aadharID, date of birth, and city name in address (understand the address and only give the city name in location) example: {\"name\": \"John Doe\", \"aadharID\": \"1234 5678 9012\", \"dob\": \"01/01/2000\", \"location\": \"New York\"}, these are the default value of any are missing do not write anything except of the fromat of the json"
+
+# Longest a GET on a signup job may block waiting for the result
+SIGNUP_JOB_MAX_WAIT = float(os.environ.get('SIGNUP_JOB_MAX_WAIT', 30))
+
+
+# With SIGNUP_PERSIST=1, extraction results are written to MongoDB (config.py)
+# in batches by a background thread; the Aadhaar number is stored only as an
+# HMAC under AADHAAR_HASH_KEY
+result_store = None
+if os.environ.get('SIGNUP_PERSIST', '0') == '1':
+    result_store = ResultStore(
+        mongo_collection,
+        os.environ.get('AADHAAR_HASH_KEY'),
+        batch_size=int(os.environ.get('SIGNUP_PERSIST_BATCH_SIZE', 100)),
+        flush_interval=float(os.environ.get('SIGNUP_PERSIST_INTERVAL', 1)),
+        max_buffered=int(os.environ.get('SIGNUP_PERSIST_MAX_BUFFERED', 1000)),
+        put_timeout=float(os.environ.get('SIGNUP_PERSIST_PUT_TIMEOUT', 0.05)),
+    )
+    Gauge('agroboost_persist_buffered', "Extraction results waiting to be written to MongoDB.",
+          lambda: result_store.stats()['buffered'])
+
+
+def persist_result(result):
+    if result_store is None:
+        return
+    try:
+        result_store.save(result)
+    except Exception as e:
+        # Persistence is best effort; the signup itself already succeeded
+        logger.error("Error persisting extraction result: %s", e)
+
+
+def run_signup_job(image_bytes):
+    """Extract the Aadhaar details for a queued signup; upstream failures are retried."""
+    try:
+        result = extract_text_from_image(image_bytes, SIGNUP_PROMPT)
+    except UpstreamUnavailable as e:
+        raise RetryableError(str(e))
+    if not result:
+        ERRORS.labels('signup_job', 'model').inc()
+        raise RetryableError("Failed to analyze image")
+    persist_result(result)
+    return result
+
+
+# Async signups: uploads wait in SQLite (until processed) for a few background
+# workers, encrypted under SIGNUP_JOBS_KEY; without a key every signup is
+# answered synchronously
+signup_jobs = None
+if os.environ.get('SIGNUP_JOBS_KEY'):
+    signup_jobs = JobQueue(
+        os.environ.get('SIGNUP_JOBS_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'signup_jobs.sqlite3')),
+        run_signup_job,
+        os.environ['SIGNUP_JOBS_KEY'],
+        workers=int(os.environ.get('SIGNUP_JOB_WORKERS', 2)),
+        max_attempts=int(os.environ.get('SIGNUP_JOB_MAX_ATTEMPTS', 3)),
+        backoff=float(os.environ.get('SIGNUP_JOB_BACKOFF', 2)),
+        deadline=float(os.environ.get('SIGNUP_JOB_DEADLINE', 120)),
+        max_pending=int(os.environ.get('SIGNUP_JOB_MAX_PENDING', 200)),
+        result_ttl=float(os.environ.get('SIGNUP_JOB_RESULT_TTL', 900)),
+    )
+    Gauge('agroboost_signup_jobs_depth', "Signup jobs queued or running.", lambda: signup_jobs.stats()['depth'])
+    Gauge('agroboost_signup_jobs_oldest_age_seconds', "Age of the oldest queued signup job.",
+          lambda: signup_jobs.stats()['oldestQueuedAgeSeconds'])
+
+
+@api_bp.before_app_request
+def start_signup_workers():
+    # Threads don't survive a fork, so each serving process starts its own on first request
+    if signup_jobs is not None:
+        signup_jobs.start()
+
+
+def wants_async():
+    if signup_jobs is None:
+        # Async is only a preference (RFC 7240); answer it synchronously
+        return False
+    return request.args.get('async', '').lower() in ('1', 'true') or 'respond-async' in request.headers.get('Prefer', '')
+
 @api_bp.route('/signup', methods=['POST'])
 def signup():
     try:
         # Get the image from the request
         image = request.files.get('aadhaarImage')
-        prompt = "PLease parse this aadhar card image and extract the details as a JSON string, only fetch the name, aadharID, date of birth, and city name in address (understand the address and only give the city name in location) example: {\"name\": \"John Doe\", \"aadharID\": \"1234 5678 9012\", \"dob\": \"01/01/2000\", \"location\": \"New York\"}, these are the default value of any are missing do not write anything except of the fromat of the json"
         if not image:
             return jsonify({"error": "No image provided"}), 400
         
-        # Save the image to a temporary file
-        image_path = "temp_image.jpg"
-        image.save(image_path)
+        # Read, decode and downscale the upload in memory; only async jobs store it, until processed
+        try:
+            image_bytes, timings = intake_image(image.stream)
+        except UploadTooLarge as e:
+            ERRORS.labels('signup', 'too_large').inc()
+            return jsonify({"error": str(e)}), 413
+        except InvalidImage as e:
+            ERRORS.labels('signup', 'invalid_image').inc()
+            return jsonify({"error": str(e)}), 400
         
-        # Call the LLaMA model to analyze the image
-        result = extract_text_from_image(image_path, prompt)
+        # Async mode (?async=1 or "Prefer: respond-async"): queue the extraction and return at once
+        if wants_async():
+            try:
+                job_id = signup_jobs.submit(image_bytes)
+            except QueueFull as e:
+                ERRORS.labels('signup', 'queue_full').inc()
+                logger.warning("Signup queue full: %s", e)
+                response = jsonify({"error": "Too many signups in progress, please retry"})
+                response.headers['Retry-After'] = '10'
+                return response, 503
+            status_url = f"{request.script_root}/api/signup/jobs/{job_id}"
+            response = jsonify({"jobId": job_id, "status": "queued", "statusUrl": status_url})
+            response.headers['Location'] = status_url
+            return response, 202
+        
+        # Call the Gemini model to analyze the image
+        started = time.perf_counter()
+        try:
+            result = extract_text_from_image(image_bytes, SIGNUP_PROMPT)
+        except UpstreamUnavailable as e:
+            ERRORS.labels('signup', 'unavailable').inc()
+            logger.warning("Image analysis unavailable: %s", e)
+            response = jsonify({"error": "Image analysis is temporarily unavailable, please retry"})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        timings['model'] = (time.perf_counter() - started) * 1000
+        for stage in ('read', 'decode', 'resize', 'encode', 'model'):
+            STAGE_SECONDS.labels('signup', stage).observe(timings[stage] / 1000)
+        
+        logger.info(
+            "Signup stages (ms): read=%.1f decode=%.1f resize=%.1f encode=%.1f model=%.1f, %d bytes sent",
+            timings['read'], timings['decode'], timings['resize'], timings['encode'], timings['model'],
+            len(image_bytes)
+        )
         
         if result:
-            logger.info(f"Analyzed image: {result}")
-            return jsonify(result), 200
+            logger.info("Analyzed image: %d chars of JSON", len(result))
+            persist_result(result)
+            with STAGE_SECONDS.labels('signup', 'serialize').time():
+                response = jsonify(result)
+            return response, 200
         else:
+            ERRORS.labels('signup', 'model').inc()
             return jsonify({"error": "Failed to analyze image"}), 500
     
+    except RequestEntityTooLarge:
+        ERRORS.labels('signup', 'too_large').inc()
+        return jsonify({"error": "Image too large"}), 413
     except Exception as e:
-        logger.error(f"Error analyzing image: {e}")
+        ERRORS.labels('signup', 'internal').inc()
+        logger.error("Error analyzing image: %s", e)
         logger.error(traceback.format_exc())
         return jsonify({"error": "Internal server error"}), 500
 
 
+@api_bp.route('/signup/jobs/<job_id>', methods=['GET'])
+def signup_job(job_id):
+    # ?wait=N long-polls for up to N seconds until the job finishes
+    if signup_jobs is None:
+        return jsonify({"error": "Job not found"}), 404
+    wait = min(max(request.args.get('wait', 0, type=float), 0), SIGNUP_JOB_MAX_WAIT)
+    job = signup_jobs.wait(job_id, wait) if wait else signup_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@api_bp.route('/signup/stats', methods=['GET'])
+def signup_stats():
+    # Extraction cache hits/misses/coalesced, the Gemini concurrency and breaker state, the job queue and persistence
+    return jsonify({
+        **client_stats(),
+        "jobs": signup_jobs.stats() if signup_jobs is not None else None,
+        "persistence": result_store.stats() if result_store is not None else None
+    }), 200
+
+
 @api_bp.route('/schemes', methods=['GET'])
 def schemes():
     try:
@@ -46,116 +216,26 @@ def schemes():
         income_group = request.args.get('income', '').lower()
         gender = request.args.get('gender', '').lower()
         
-        # Load schemes from JSON file
-        json_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                'utilities', 'schemes.json')
+        # Make sure the index reflects schemes.json, rebuilding it if the file changed
+        with STAGE_SECONDS.labels('schemes', 'load').time():
+            scheme_index.refresh()
         
-        with open(json_path, 'r', encoding='utf-8') as f:
-            all_schemes = json.load(f)
+        # Serve the pre-serialized body for this filter combination
+        with STAGE_SECONDS.labels('schemes', 'filter').time():
+            body, etag = scheme_index.response(state, category, income_group, gender)
         
-        # Clean and process schemes
-        processed_schemes = []
-        for scheme in all_schemes:
-            if 'Scheme Name' not in scheme or not scheme['Scheme Name'] or 'Details' not in scheme:
-                continue
-                
-            scheme_name = scheme['Scheme Name'].strip()
-            details = scheme['Details'].strip()
-            
-            if not scheme_name and not details:
-                continue
-                
-            # Skip header row
-            if scheme_name == "Name       of       the Scheme" and details == "Purpose":
-                continue
-                
-            # Create cleaned scheme object
-            cleaned_scheme = {
-                "name": scheme_name,
-                "description": details,
-                "category": "agriculture",  # Default category
-            }
-            
-            # Categorize schemes (you can expand this based on keywords)
-            lower_name = scheme_name.lower()
-            lower_details = details.lower()
-            
-            if "kisan" in lower_name:
-                cleaned_scheme["category"] = "farmer support"
-            elif "fasal bima" in lower_name:
-                cleaned_scheme["category"] = "insurance"
-            elif "infrastructure" in lower_name or "fund" in lower_name:
-                cleaned_scheme["category"] = "infrastructure"
-            elif "irrigation" in lower_name or "water" in lower_details:
-                cleaned_scheme["category"] = "irrigation"
-            elif "organic" in lower_name:
-                cleaned_scheme["category"] = "organic farming"
-            elif "digital" in lower_name:
-                cleaned_scheme["category"] = "technology"
-            
-            # Apply filters if specified
-            if category and category not in cleaned_scheme["category"].lower():
-                continue
-                
-            # Add eligibility info based on scheme details
-            cleaned_scheme["eligibility"] = {
-                "states": ["All States"],  # Default
-                "income_groups": ["All"],  # Default
-                "gender": ["All"]         # Default
-            }
-            
-            # Northeast specific schemes
-            if "north eastern region" in lower_name or "north east" in lower_details:
-                cleaned_scheme["eligibility"]["states"] = [
-                    "Arunachal Pradesh", "Assam", "Manipur", "Meghalaya", 
-                    "Mizoram", "Nagaland", "Sikkim", "Tripura"
-                ]
-                
-            # Check for gender specific schemes
-            if "women" in lower_name or "women" in lower_details or "namo drone didi" in lower_name.lower():
-                cleaned_scheme["eligibility"]["gender"] = ["Female"]
-                
-            # Income group specific (if mentioned)
-            if "small and marginal farmers" in lower_details:
-                cleaned_scheme["eligibility"]["income_groups"] = ["Low", "Lower Middle"]
-                
-            # Add to processed list
-            processed_schemes.append(cleaned_scheme)
-            
-        # Apply additional filters
-        filtered_schemes = processed_schemes
-        if state:
-            filtered_schemes = [
-                s for s in filtered_schemes if 
-                "All States" in s["eligibility"]["states"] or 
-                any(state in st.lower() for st in s["eligibility"]["states"])
-            ]
-            
-        if gender:
-            filtered_schemes = [
-                s for s in filtered_schemes if 
-                "All" in s["eligibility"]["gender"] or 
-                gender in [g.lower() for g in s["eligibility"]["gender"]]
-            ]
-            
-        if income_group:
-            filtered_schemes = [
-                s for s in filtered_schemes if 
-                "All" in s["eligibility"]["income_groups"] or 
-                any(income_group in ig.lower() for ig in s["eligibility"]["income_groups"])
-            ]
-            
-        # Add an ID for easier frontend referencing
-        for i, scheme in enumerate(filtered_schemes):
-            scheme["id"] = i + 1
-            
-        return jsonify({
-            "count": len(filtered_schemes),
-            "schemes": filtered_schemes
-        }), 200
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
-        logger.error(f"Error fetching schemes: {e}")
+        ERRORS.labels('schemes', 'internal').inc()
+        FALLBACKS.labels('schemes').inc()
+        logger.error("Error fetching schemes: %s", e)
         logger.error(traceback.format_exc())
         return jsonify({
             "error": "Error fetching schemes",
@@ -165,4 +245,35 @@ def schemes():
                 {"name": "PM Jan Dhan Yojana", "description": "Financial scheme to provide banking services to all"},
                 {"name": "PM Ujjwala Yojana", "description": "LPG scheme to provide clean cooking fuel to all"},
             ]
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@api_bp.route('/schemes/search', methods=['GET'])
+def search_schemes():
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            ERRORS.labels('search', 'bad_request').inc()
+            return jsonify({"error": "Missing search query parameter 'q'"}), 400
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+        
+        # Filters narrow the postings before ranking, same semantics as /schemes
+        with STAGE_SECONDS.labels('search', 'rank').time():
+            results = scheme_search.search(
+                query,
+                page=page,
+                per_page=per_page,
+                state=request.args.get('state', '').lower(),
+                category=request.args.get('category', '').lower(),
+                income_group=request.args.get('income', '').lower(),
+                gender=request.args.get('gender', '').lower()
+            )
+        return jsonify(results), 200
+        
+    except Exception as e:
+        ERRORS.labels('search', 'internal').inc()
+        logger.error("Error searching schemes: %s", e)
+        logger.error(traceback.format_exc())
+        return jsonify({"error": "Error searching schemes"}), 500
@@ -0,0 +1,132 @@
+import os
+import re
+import hmac
+import time
+import uuid
+import logging
+import threading
+from flask import Blueprint, g, jsonify, request, send_from_directory
+from utilities.profile_sessions import SessionActive, SessionCoordinator
+from utilities.profiler import CPROFILE, SAMPLE, Profile, ProfilerBusy
+
+
+# On-demand profiling, registered under /debug only when AI_PROFILING_ENABLED=1.
+#
+#   X-Profile: cprofile | sample   (or ?profile=...) on any request saves a
+#       profile of that request and names the file in X-Profile-File
+#   POST /debug/profile/session?seconds=N   samples every worker for N seconds
+#   DELETE /debug/profile/session           ends the session early
+#   GET /debug/profiles/<name>              downloads a saved profile
+#
+# When AI_PROFILING_TOKEN is set, every one of these needs a matching
+# X-Profile-Token header; profile requests without it are served unprofiled.
+debug_bp = Blueprint('debug', __name__)
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get('AI_PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'profiles'))
+PROFILING_TOKEN = os.environ.get('AI_PROFILING_TOKEN', '')
+
+# Request ids come from the client (X-Request-ID); only these may go into a file name
+SAFE_REQUEST_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+sessions = SessionCoordinator(
+    PROFILE_DIR,
+    max_seconds=float(os.environ.get('AI_PROFILE_MAX_SECONDS', 60)),
+    interval=float(os.environ.get('AI_PROFILE_INTERVAL_MS', 5)) / 1000,
+)
+
+
+def authorized():
+    if not PROFILING_TOKEN:
+        return True
+    return hmac.compare_digest(request.headers.get('X-Profile-Token', ''), PROFILING_TOKEN)
+
+
+def requested_kind():
+    value = (request.headers.get('X-Profile') or request.args.get('profile') or '').lower()
+    if value in ('1', 'true', CPROFILE):
+        return CPROFILE
+    if value in (SAMPLE, 'speedscope'):
+        return SAMPLE
+    return None
+
+
+@debug_bp.before_app_request
+def start_request_profile():
+    # Join worker-wide sessions; the thread is started once per process
+    sessions.watch()
+    kind = requested_kind()
+    if kind is None or not authorized():
+        return
+    try:
+        # Only the thread serving this request; work handed to other threads
+        # (like the Gemini call) shows up as time spent waiting for it
+        g.profile = Profile(kind, sessions.interval, thread_ids=[threading.get_ident()]).start()
+    except ProfilerBusy:
+        g.profile_error = 'busy'
+
+
+@debug_bp.after_app_request
+def save_request_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        if 'profile_error' in g:
+            response.headers['X-Profile-Error'] = g.profile_error
+        return response
+    profile.stop()
+    request_id = g.get('request_id', '')
+    if not SAFE_REQUEST_ID.fullmatch(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    name = f"request-{time.strftime('%Y%m%d-%H%M%S')}-{request_id}{profile.extension}"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.save(os.path.join(PROFILE_DIR, name), name=f"{request.method} {request.path}")
+        response.headers['X-Profile-File'] = name
+    except OSError as e:
+        logger.error("Error saving profile %s: %s", name, e)
+        response.headers['X-Profile-Error'] = 'save failed'
+    return response
+
+
+@debug_bp.teardown_app_request
+def stop_request_profile(exc):
+    # The response was never finished; don't leave the profiler running
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+
+
+@debug_bp.route('/profile/session', methods=['GET', 'POST', 'DELETE'])
+def profile_session():
+    if not authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'POST':
+        try:
+            control = sessions.start(request.args.get('seconds', 30, type=float))
+        except SessionActive as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify({"session": control, "active": True}), 201
+    if request.method == 'DELETE':
+        if sessions.stop() is None:
+            return jsonify({"error": "No session is running"}), 404
+    return jsonify(sessions.status()), 200
+
+
+@debug_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    if not authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        names = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(('.prof', '.speedscope.json')))
+    except OSError:
+        names = []
+    return jsonify([
+        {"name": name, "bytes": os.path.getsize(os.path.join(PROFILE_DIR, name))} for name in names
+    ]), 200
+
+
+@debug_bp.route('/profiles/<path:name>', methods=['GET'])
+def download_profile(name):
+    if not authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True)
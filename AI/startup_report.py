@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Modules that only the signup route needs; nothing else may load them at boot
+HEAVY_MODULES = ['google.genai', 'pydantic', 'pymongo', 'torch', 'transformers', 'sklearn', 'numpy']
+
+# Budgets checked by the report; 0 disables a check
+BOOT_BUDGET_MS = float(os.environ.get('AI_STARTUP_BUDGET_MS', 0))
+RSS_BUDGET_MB = float(os.environ.get('AI_STARTUP_RSS_BUDGET_MB', 0))
+
+# Runs in a fresh interpreter under -X importtime: boot the app, serve
+# /api/schemes once and report the time, RSS and which heavy modules loaded
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import app
+boot_ms = (time.perf_counter() - started) * 1000
+status = app.test_client().get('/api/schemes').status_code
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    'boot_ms': boot_ms,
+    'schemes_status': status,
+    'ready': app.config['READY'],
+    'rss_mb': rss_kb / 1024,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+'''
+
+
+def parse_importtime(stderr_text):
+    """Return {top-level package: import microseconds} from -X importtime output.
+
+    Lines look like "import time:  self [us] | cumulative | imported package".
+    Each module's self time is charged to its top-level package, so the
+    totals add up to the whole import cost without double counting nesting.
+    """
+    totals = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return totals
+
+
+def startup_report(warmup=False, top=15):
+    env = dict(os.environ, AI_WARMUP='1' if warmup else '0')
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE % (HEAVY_MODULES,)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{process.stderr[-2000:]}")
+
+    report = json.loads(process.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(process.stderr)
+    report['import_ms_total'] = round(sum(imports.values()) / 1000, 1)
+    report['top_imports_ms'] = {
+        name: round(us / 1000, 1) for name, us in sorted(imports.items(), key=lambda item: -item[1])[:top]
+    }
+    report['boot_ms'] = round(report['boot_ms'], 1)
+    report['rss_mb'] = round(report['rss_mb'], 1)
+    report['warmup'] = warmup
+    return report
+
+
+def check_budget(report, boot_budget_ms=BOOT_BUDGET_MS, rss_budget_mb=RSS_BUDGET_MB):
+    """Return a list of budget violations."""
+    problems = []
+    if boot_budget_ms and report['boot_ms'] > boot_budget_ms:
+        problems.append(f"boot took {report['boot_ms']} ms, budget {boot_budget_ms} ms")
+    if rss_budget_mb and report['rss_mb'] > rss_budget_mb:
+        problems.append(f"RSS after boot is {report['rss_mb']} MB, budget {rss_budget_mb} MB")
+    if not report['warmup'] and report['loaded']:
+        problems.append(f"heavy modules loaded before first use: {', '.join(report['loaded'])}")
+    if report['schemes_status'] != 200:
+        problems.append(f"/api/schemes returned {report['schemes_status']}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure AI service startup time and memory against a budget")
+    parser.add_argument('--warmup', action='store_true', help="boot with AI_WARMUP=1, as under gunicorn")
+    parser.add_argument('--boot-budget-ms', type=float, default=BOOT_BUDGET_MS)
+    parser.add_argument('--rss-budget-mb', type=float, default=RSS_BUDGET_MB)
+    parser.add_argument('--top', type=int, default=15, help="number of slowest imports to list")
+    args = parser.parse_args(argv)
+
+    report = startup_report(args.warmup, args.top)
+    report['budget_violations'] = check_budget(report, args.boot_budget_ms, args.rss_budget_mb)
+    print(json.dumps(report, indent=4))
+    return 1 if report['budget_violations'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import io
+import os
+import time
+import logging
+from flask import Request
+
+logger = logging.getLogger(__name__)
+
+# Uploads larger than this are rejected before decoding
+MAX_UPLOAD_BYTES = int(os.environ.get('AADHAAR_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+# Longest side of the image sent to the model, and its JPEG quality
+MAX_IMAGE_SIDE = int(os.environ.get('AADHAAR_MAX_IMAGE_SIDE', 1600))
+JPEG_QUALITY = int(os.environ.get('AADHAAR_JPEG_QUALITY', 85))
+
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class InvalidImage(ValueError):
+    """The upload could not be decoded as an image."""
+
+
+class InMemoryUploadRequest(Request):
+    """Request class that keeps file uploads in memory instead of spooling them to disk.
+
+    Pair it with MAX_CONTENT_LENGTH so the in-memory buffers stay bounded.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
+def read_upload(stream, max_bytes=MAX_UPLOAD_BYTES):
+    """Read an upload stream into memory, raising UploadTooLarge past ``max_bytes``."""
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            raise UploadTooLarge(f"Image exceeds {max_bytes} bytes")
+    return buffer.getvalue()
+
+
+def prepare_image(data, max_side=MAX_IMAGE_SIDE, quality=JPEG_QUALITY, timings=None):
+    """Decode image bytes, bound the resolution and re-encode as JPEG.
+
+    Returns the JPEG bytes. Stage durations in milliseconds are added to
+    ``timings`` under "decode", "resize" and "encode".
+    """
+    import PIL.Image
+    import PIL.ImageOps
+
+    timings = timings if timings is not None else {}
+
+    started = time.perf_counter()
+    try:
+        image = PIL.Image.open(io.BytesIO(data))
+        # JPEG can decode straight at a reduced scale, skipping most of the work;
+        # ask for the smallest scale whose longest side still covers max_side
+        ratio = max_side / max(image.size)
+        if ratio < 1:
+            image.draft('RGB', (int(image.size[0] * ratio), int(image.size[1] * ratio)))
+        image.load()
+    except Exception as e:
+        raise InvalidImage(f"Could not decode image: {e}")
+    timings['decode'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    # Phone photos are often stored sideways with an EXIF orientation tag
+    if image.getexif().get(0x0112, 1) != 1:
+        image = PIL.ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+    timings['resize'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality)
+    timings['encode'] = (time.perf_counter() - started) * 1000
+    return output.getvalue()
+
+
+def intake_image(stream, max_bytes=MAX_UPLOAD_BYTES, max_side=MAX_IMAGE_SIDE, quality=JPEG_QUALITY):
+    """Read and normalize an uploaded image entirely in memory.
+
+    Returns the bounded JPEG bytes and a dict of stage timings in
+    milliseconds ("read", "decode", "resize", "encode").
+    """
+    timings = {}
+    started = time.perf_counter()
+    data = read_upload(stream, max_bytes)
+    timings['read'] = (time.perf_counter() - started) * 1000
+
+    image_bytes = prepare_image(data, max_side, quality, timings)
+    logger.debug("Image intake: %d bytes in, %d bytes out", len(data), len(image_bytes))
+    return image_bytes, timings
@@ -0,0 +1,318 @@
+import os
+import time
+import uuid
+import base64
+import random
+import hashlib
+import sqlite3
+import logging
+import threading
+import traceback
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload BLOB,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    deadline REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    finished_at REAL
+)
+"""
+INDEX = "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, next_attempt_at)"
+
+
+class RetryableError(Exception):
+    """A transient failure; the job is attempted again after a backoff."""
+
+
+class QueueFull(Exception):
+    """Too many jobs are already waiting."""
+
+
+class JobQueue:
+    """Durable job queue in SQLite, processed by a small pool of background threads.
+
+    ``handler(payload)`` turns a job's payload bytes into a result string. It
+    raises RetryableError for transient failures, which are retried with
+    exponential backoff while attempts and the job's deadline allow; any
+    other exception fails the job.
+
+    Jobs survive restarts: queued jobs stay queued, and a job whose worker
+    died is picked up again once its lease runs out. Several processes can
+    share one database file; claiming a job is a single write transaction.
+    Payloads are deleted as soon as a job finishes, and finished jobs are
+    purged ``result_ttl`` seconds later.
+
+    Payloads and results are encrypted at rest with Fernet under ``key``
+    (any secret string), so the file never holds them in plaintext. The
+    database is created by the first ``submit``; until then the workers
+    and readers leave the filesystem alone.
+    """
+
+    def __init__(self, path, handler, key, workers=2, max_attempts=3, backoff=2.0, deadline=120.0,
+                 max_pending=200, result_ttl=900.0, lease=None, poll_interval=0.5):
+        if not key:
+            raise ValueError("An encryption key (SIGNUP_JOBS_KEY) is required to queue signup jobs")
+        from cryptography.fernet import Fernet
+        key = key.encode('utf-8') if isinstance(key, str) else key
+        self._fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(key).digest()))
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.deadline = deadline
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        # A claimed job is considered abandoned after this long
+        self.lease = lease if lease is not None else deadline
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._db = None
+        self._db_pid = None
+        self._started_pid = None
+        self._stopping = threading.Event()
+        self._threads = []
+        self._last_purge = 0.0
+
+    def _connection(self):
+        # One connection per process, shared by its threads under self._lock
+        if self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            # Overwrite deleted payloads instead of leaving them in free pages
+            self._db.execute("PRAGMA secure_delete=ON")
+            self._db.execute(SCHEMA)
+            self._db.execute(INDEX)
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _exists(self):
+        return self._db_pid == os.getpid() or os.path.exists(self.path)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def _decrypt(self, token):
+        from cryptography.fernet import InvalidToken
+        try:
+            return self._fernet.decrypt(bytes(token))
+        except InvalidToken:
+            return None
+
+    def start(self):
+        """Start the worker threads in this process, if they are not running yet.
+
+        Safe to call on every request: after a fork the child starts its own
+        threads, since threads don't survive fork.
+        """
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._started_pid = os.getpid()
+        logger.info("Started %s job workers for %s", self.workers, self.path)
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._started_pid = None
+
+    def submit(self, payload):
+        """Queue a job and return its id. Raises QueueFull past ``max_pending``."""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFull(f"{pending} jobs pending")
+                db.execute(
+                    "INSERT INTO jobs (id, status, payload, created_at, deadline, next_attempt_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, sqlite3.Binary(self._fernet.encrypt(payload)), now, now + self.deadline, now)
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        with self._changed:
+            self._changed.notify_all()
+        return job_id
+
+    def get(self, job_id):
+        """Return the public view of a job, or None if it doesn't exist (or was purged)."""
+        if not self._exists():
+            return None
+        rows = self._execute(
+            "SELECT id, status, result, error, attempts, created_at, finished_at FROM jobs WHERE id = ?", (job_id,)
+        )
+        if not rows:
+            return None
+        job_id, status, result, error, attempts, created_at, finished_at = rows[0]
+        job = {"jobId": job_id, "status": status, "attempts": attempts, "createdAt": created_at}
+        if status == DONE:
+            result = self._decrypt(result)
+            if result is None:
+                # Written under another key
+                job["status"] = FAILED
+                job["error"] = "Result could not be decrypted"
+            else:
+                job["result"] = result.decode('utf-8')
+        if status == FAILED:
+            job["error"] = error
+        if finished_at is not None:
+            job["finishedAt"] = finished_at
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: return the job once it finished, or its current state after ``timeout`` seconds."""
+        give_up = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = give_up - time.monotonic()
+            if job is None or job["status"] in (DONE, FAILED) or remaining <= 0:
+                return job
+            # Woken early by local workers; jobs finished by other processes are seen on the next poll
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, payload, attempts, deadline FROM jobs "
+                    "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                        (RUNNING, now + self.lease, row[0])
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None):
+        if result is not None:
+            result = sqlite3.Binary(self._fernet.encrypt(result.encode('utf-8')))
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, lease_until = NULL, finished_at = ? "
+            "WHERE id = ?",
+            (status, result, error, time.time(), job_id)
+        )
+        with self._changed:
+            self._changed.notify_all()
+
+    def _retry(self, job_id, attempts, deadline, error):
+        delay = self.backoff * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+        if attempts >= self.max_attempts or time.time() + delay >= deadline:
+            self._finish(job_id, FAILED, error=error)
+            return
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, next_attempt_at = ?, lease_until = NULL WHERE id = ?",
+            (QUEUED, error, time.time() + delay, job_id)
+        )
+
+    def _process(self, job):
+        job_id, payload, attempts, deadline = job
+        attempts += 1
+        if time.time() >= deadline:
+            self._finish(job_id, FAILED, error="Deadline exceeded before the job could run")
+            return
+        payload = self._decrypt(payload)
+        if payload is None:
+            self._finish(job_id, FAILED, error="Payload could not be decrypted")
+            return
+        try:
+            result = self.handler(payload)
+        except RetryableError as e:
+            logger.warning("Job %s attempt %s failed: %s", job_id, attempts, e)
+            self._retry(job_id, attempts, deadline, str(e))
+        except Exception as e:
+            logger.error("Job %s failed: %s", job_id, e)
+            logger.error(traceback.format_exc())
+            self._finish(job_id, FAILED, error="Internal error")
+        else:
+            self._finish(job_id, DONE, result=result)
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                      (DONE, FAILED, now - self.result_ttl))
+
+    def _work(self):
+        while not self._stopping.is_set():
+            if not self._exists():
+                # Nothing was ever submitted; don't create the database just to poll it
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            try:
+                self._purge()
+                job = self._claim()
+            except Exception as e:
+                logger.error("Job queue error: %s", e)
+                job = None
+            if job is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            self._process(job)
+
+    def stats(self):
+        """Queue depth by status and the age of the oldest queued job, for capacity planning."""
+        now = time.time()
+        rows = self._execute("SELECT status, COUNT(*), MIN(created_at) FROM jobs GROUP BY status") if self._exists() else []
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        oldest_queued = None
+        for status, count, oldest in rows:
+            counts[status] = count
+            if status == QUEUED:
+                oldest_queued = oldest
+        return {
+            "depth": counts[QUEUED] + counts[RUNNING],
+            "counts": counts,
+            "oldestQueuedAgeSeconds": round(now - oldest_queued, 3) if oldest_queued is not None else 0.0,
+            "workers": self.workers,
+            "maxPending": self.max_pending,
+        }
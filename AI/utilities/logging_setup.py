@@ -0,0 +1,236 @@
+"""Non-blocking, structured logging for the AI service.
+
+Request threads only put records on an in-memory queue; a background
+listener thread formats them as JSON lines and writes them to the console
+and a size-rotated file. Records carry the id of the request that produced
+them. Large messages are truncated and chatty levels can be sampled before
+they reach the queue, so a burst of requests cannot back up on log I/O.
+
+Settings (environment):
+    AI_LOG_LEVEL            root level, default INFO
+    AI_LOG_FILE             log file, default agroboost_ai.log; empty disables it.
+                            "{pid}" in the name is replaced by the process id
+    AI_LOG_MAX_BYTES        rotate the file at this size, default 10 MB
+    AI_LOG_BACKUPS          rotated files kept, default 5
+    AI_LOG_CONSOLE_FORMAT   "json" (default) or "text" for local development
+    AI_LOG_MAX_CHARS        longest message kept, default 2000
+    AI_LOG_SAMPLE_RATE      share of DEBUG/INFO records kept, default 1.0
+    AI_LOG_QUEUE_SIZE       records buffered before new ones are dropped, default 10000
+
+A file is only ever written and rotated by one process. A process forked
+after logging was configured (a preloaded gunicorn worker) reopens the file
+as ``<name>.<pid><ext>``, and without preloading use "{pid}" to give every
+worker its own file. gunicorn.conf.py defaults to console output only.
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+import zlib
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Id of the request being handled by the current thread ("-" outside requests)
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to every record."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only ``rate`` of the records below WARNING.
+
+    Records of one request are kept or dropped together, so a sampled request
+    can still be followed from start to end.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+        self._threshold = int(rate * 10000)
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        request_id = getattr(record, 'request_id', '-')
+        if request_id != '-':
+            return zlib.crc32(request_id.encode('utf-8')) % 10000 < self._threshold
+        return random.random() < self.rate
+
+
+class TruncatingFilter(logging.Filter):
+    """Merge the message arguments once and cut the result to ``max_chars``."""
+
+    def __init__(self, max_chars=2000):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record):
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [truncated {len(message) - self.max_chars} chars]"
+        record.msg = message
+        record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, 'request_id', '-'),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # The filters already merged the message. Render the traceback now,
+        # since traceback objects must not outlive the logging call
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_exception_formatter = logging.Formatter()
+
+
+_listener = None
+_handler = None
+# (log_file, max_bytes, backups) of the configured file, for reopening it after a fork
+_file_settings = None
+_lock = threading.Lock()
+
+
+def _file_handler(log_file, max_bytes, backups):
+    handler = RotatingFileHandler(log_file.replace('{pid}', str(os.getpid())), maxBytes=max_bytes,
+                                  backupCount=backups, encoding='utf-8')
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _output_handlers(log_file, max_bytes, backups, console_format):
+    handlers = []
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(JsonFormatter() if console_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    handlers.append(console)
+    if log_file:
+        handlers.append(_file_handler(log_file, max_bytes, backups))
+    return handlers
+
+
+def configure_logging(level=None, log_file=None, max_bytes=None, backups=None, console_format=None,
+                      max_chars=None, sample_rate=None, queue_size=None):
+    """Route all logging through a queue to a background listener thread.
+
+    Arguments default to the AI_LOG_* environment settings. Returns the
+    listener; it is stopped (and the queue flushed) at interpreter exit.
+    """
+    global _listener, _handler, _file_settings
+
+    level = level or os.environ.get('AI_LOG_LEVEL', 'INFO')
+    log_file = log_file if log_file is not None else os.environ.get('AI_LOG_FILE', 'agroboost_ai.log')
+    max_bytes = max_bytes or int(os.environ.get('AI_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    backups = backups if backups is not None else int(os.environ.get('AI_LOG_BACKUPS', 5))
+    console_format = console_format or os.environ.get('AI_LOG_CONSOLE_FORMAT', 'json')
+    max_chars = max_chars or int(os.environ.get('AI_LOG_MAX_CHARS', 2000))
+    sample_rate = sample_rate if sample_rate is not None else float(os.environ.get('AI_LOG_SAMPLE_RATE', 1.0))
+    queue_size = queue_size or int(os.environ.get('AI_LOG_QUEUE_SIZE', 10000))
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        handler = DroppingQueueHandler(log_queue)
+        # Order matters: the request id decides sampling, and only kept records are formatted
+        handler.addFilter(RequestIdFilter())
+        handler.addFilter(SamplingFilter(sample_rate))
+        handler.addFilter(TruncatingFilter(max_chars))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        listener = QueueListener(log_queue, *_output_handlers(log_file, max_bytes, backups, console_format),
+                                 respect_handler_level=True)
+        listener.start()
+        _listener, _handler = listener, handler
+        _file_settings = (log_file, max_bytes, backups) if log_file else None
+    return listener
+
+
+def _restart_after_fork():
+    # The listener thread stays behind in the parent; give the child its own queue and thread
+    global _listener
+    if _listener is None:
+        return
+    handlers = []
+    for output in _listener.handlers:
+        if isinstance(output, RotatingFileHandler) and _file_settings is not None:
+            # Two processes rotating one file lose and interleave lines; the child gets a file of its own
+            output.close()
+            log_file, max_bytes, backups = _file_settings
+            if '{pid}' not in log_file:
+                root, extension = os.path.splitext(log_file)
+                log_file = f"{root}.{{pid}}{extension}"
+            output = _file_handler(log_file, max_bytes, backups)
+        handlers.append(output)
+    log_queue = queue.Queue(maxsize=_handler.queue.maxsize)
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop():
+    if _listener is not None:
+        _listener.stop()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(_stop)
+
+
+def dropped_records():
+    """Number of records dropped because the queue was full."""
+    return _handler.dropped if _handler is not None else 0
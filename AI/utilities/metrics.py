@@ -0,0 +1,271 @@
+"""Counters, histograms and gauges rendered in the Prometheus text format.
+
+Recording is lock-free on the hot path: every thread writes to its own shard
+of each metric, and shards are only summed when the metrics are rendered.
+Locks are taken when a thread first touches a metric or a new label set.
+
+Each process keeps its own values; under a forking server every worker
+reports its own series, so scrape the workers individually or label them.
+
+This module has no dependencies outside the standard library. The crop
+recommender worker imports this same file (backend/models/crop_recommender.py
+puts AI/utilities on its path), so keep it free of AI-service imports.
+"""
+import os
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Shards:
+    """Per-thread lists of numbers that are summed on read."""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = []
+
+    def get(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0] * self.size
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def totals(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(shard[i] for shard in shards) for i in range(self.size)]
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.get()[0] += amount
+
+    def value(self):
+        return self._shards.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket, one for +Inf, then the sum
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value):
+        shard = self._shards.get()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def time(self):
+        """Context manager that observes the duration of its block in seconds."""
+        return _Timer(self)
+
+    def snapshot(self):
+        """Return (cumulative bucket counts including +Inf, sum)."""
+        totals = self._shards.totals()
+        cumulative = []
+        running = 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child series for these label values, in ``labelnames`` order."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _reset(self):
+        for child in self._children.values():
+            child._shards._reset()
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_number(child.value())}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            cumulative, total = child.snapshot()
+            for bound, count in zip(self.buckets + (float('inf'),), cumulative):
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                yield f"{self.name}_bucket{self._label_text(values, [('le', le)])} {count}"
+            yield f"{self.name}_sum{self._label_text(values)} {_number(total)}"
+            yield f"{self.name}_count{self._label_text(values)} {cumulative[-1]}"
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from ``function`` when the metrics are rendered."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function, registry=None):
+        self.function = function
+        super().__init__(name, documentation, (), registry)
+
+    def _new_child(self):
+        return None
+
+    def _reset(self):
+        pass
+
+    def samples(self):
+        try:
+            value = self.function()
+        except Exception:
+            return
+        if value is not None:
+            yield f"{self.name} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def reset(self):
+        """Drop all recorded values, e.g. in a freshly forked worker."""
+        with self._lock:
+            for metric in self._metrics:
+                metric._reset()
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = Registry()
+# Values recorded by the parent before a fork belong to the parent
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=REGISTRY.reset)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # Peak rather than current RSS where /proc is unavailable; kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+_started = time.time()
+
+Gauge('process_resident_memory_bytes', "Resident memory size in bytes.", _rss_bytes)
+Gauge('process_open_fds', "Number of open file descriptors.", _open_fds)
+Gauge('process_threads', "Number of Python threads.", threading.active_count)
+Gauge('process_start_time_seconds', "Start time of the process since the epoch in seconds.", lambda: _started)
@@ -0,0 +1,275 @@
+import os
+import hmac
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from config import COLLECTION_NAME, DATABASE_NAME, MONGO_URI
+from utilities.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Connections kept per process by the shared MongoClient
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 10))
+# Milliseconds to wait for a reachable server before a write fails
+MONGO_TIMEOUT_MS = int(os.environ.get('MONGO_TIMEOUT_MS', 5000))
+
+FLUSH_SECONDS = Histogram('agroboost_persist_flush_duration_seconds', "Time to write one batch of results to MongoDB.")
+BATCH_SIZE = Histogram('agroboost_persist_batch_size', "Documents per batch written to MongoDB.",
+                       buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+DOCUMENTS = Counter('agroboost_persist_documents_total', "Result documents by outcome: inserted, failed or dropped.",
+                    ('outcome',))
+
+# Fields of an extraction kept in MongoDB; the Aadhaar number itself is only stored as a keyed hash
+STORED_FIELDS = ('name', 'dob', 'location')
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+_STOP = object()
+
+# MongoDB error code of a write that collides with an existing _id
+DUPLICATE_KEY = 11000
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use.
+
+    All threads share its connection pool. pymongo clients are not fork-safe,
+    so a forked worker creates its own.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        from pymongo import MongoClient
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE,
+                                      serverSelectionTimeoutMS=MONGO_TIMEOUT_MS, connect=False)
+                _client_pid = os.getpid()
+    return _client
+
+
+def mongo_collection():
+    """The collection extraction results are written to (see config.py)."""
+    return get_client()[DATABASE_NAME][COLLECTION_NAME]
+
+
+def aadhaar_hash(aadhar_id, key):
+    """HMAC-SHA256 of the digits of an Aadhaar number, as hex.
+
+    A plain hash of a 12-digit number is trivially reversed by enumeration;
+    without the key the stored value reveals nothing.
+    """
+    digits = ''.join(ch for ch in str(aadhar_id) if ch.isdigit())
+    return hmac.new(key, digits.encode('ascii'), hashlib.sha256).hexdigest()
+
+
+class ResultStore:
+    """Buffers extraction results in memory and writes them to MongoDB in batches.
+
+    ``save`` only puts a document on a bounded buffer. A background thread
+    writes a batch with ``insert_many(ordered=False)`` once ``batch_size``
+    documents are waiting or the oldest has waited ``flush_interval``
+    seconds. When the buffer is full, ``save`` waits up to ``put_timeout``
+    seconds for room and then drops the document, so an unreachable database
+    delays a signup by a bounded amount and never grows memory without limit.
+
+    ``collection`` is a callable returning the target collection, so tests
+    can pass an in-process stand-in with ``insert_many``, ``create_index``
+    and ``find``.
+    """
+
+    def __init__(self, collection, hash_key, batch_size=100, flush_interval=1.0, max_buffered=1000,
+                 put_timeout=0.05, max_retries=2, retry_backoff=0.5):
+        if not hash_key:
+            raise ValueError("A hash key (AADHAAR_HASH_KEY) is required to persist extraction results")
+        self.collection = collection
+        self.hash_key = hash_key.encode('utf-8') if isinstance(hash_key, str) else hash_key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._buffer = queue.Queue(maxsize=max_buffered)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started_pid = None
+        self._indexed_pid = None
+        self._counts = {"inserted": 0, "failed": 0, "dropped": 0, "batches": 0}
+        self._last_flush_ms = None
+        atexit.register(self.stop)
+
+    def start(self):
+        """Start the flusher thread in this process, if it is not running yet."""
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            # Documents buffered by the parent before a fork stay with the parent
+            if self._started_pid is not None:
+                self._buffer = queue.Queue(maxsize=self.max_buffered)
+            self._thread = threading.Thread(target=self._run, name="result-flusher", daemon=True)
+            self._thread.start()
+            self._started_pid = os.getpid()
+
+    def stop(self, timeout=5.0):
+        """Write out everything buffered and stop the flusher thread."""
+        if self._started_pid != os.getpid():
+            return
+        try:
+            self._buffer.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Result buffer still full at shutdown; %d results not written", self._buffer.qsize())
+            return
+        self._thread.join(timeout)
+        self._started_pid = None
+
+    def document(self, details):
+        """Build the stored document for one set of Aadhaar details."""
+        aadhar_id = details.get('aadharID')
+        document = {name: details.get(name) for name in STORED_FIELDS}
+        document['aadharHash'] = aadhaar_hash(aadhar_id, self.hash_key) if aadhar_id else None
+        document['createdAt'] = datetime.now(timezone.utc)
+        return document
+
+    def save(self, extraction):
+        """Queue the cards of an extraction for writing; returns False if any were not queued.
+
+        ``extraction`` is the JSON text returned by the model (a list of
+        Aadhaar details, or a single object), or the parsed value.
+        """
+        if isinstance(extraction, (str, bytes)):
+            try:
+                extraction = json.loads(extraction)
+            except ValueError:
+                extraction = None
+        if isinstance(extraction, dict):
+            extraction = [extraction]
+        if not isinstance(extraction, list) or not all(isinstance(item, dict) for item in extraction):
+            logger.warning("Extraction is not a list of JSON objects; not persisted")
+            return False
+
+        self.start()
+        queued = True
+        for details in extraction:
+            try:
+                self._buffer.put(self.document(details), timeout=self.put_timeout)
+            except queue.Full:
+                self._count("dropped", 1)
+                logger.warning("Result buffer full (%d); extraction not persisted", self.max_buffered)
+                queued = False
+        return queued
+
+    def find_by_aadhaar(self, aadhar_id, limit=10):
+        """Return the stored results for an Aadhaar number, newest first."""
+        cursor = self.collection().find({'aadharHash': aadhaar_hash(aadhar_id, self.hash_key)}, {'_id': 0})
+        return list(cursor.sort('createdAt', -1).limit(limit))
+
+    def _count(self, outcome, amount):
+        DOCUMENTS.labels(outcome).inc(amount)
+        with self._lock:
+            self._counts[outcome] += amount
+
+    def _ensure_indexes(self, collection):
+        if self._indexed_pid != os.getpid():
+            # Serves find_by_aadhaar: equality on the hash, newest first
+            collection.create_index([('aadharHash', 1), ('createdAt', -1)])
+            self._indexed_pid = os.getpid()
+
+    def _write(self, batch):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                collection = self.collection()
+                self._ensure_indexes(collection)
+                collection.insert_many(batch, ordered=False)
+            except Exception as e:
+                details = getattr(e, 'details', None)
+                if isinstance(details, dict) and 'nInserted' in details:
+                    # BulkWriteError: the other documents were written; rejected ones are not retried.
+                    # insert_many gives every document an _id, so on a retry after a partial write the
+                    # documents already stored come back as duplicate keys; they were inserted
+                    errors = details.get('writeErrors', ())
+                    duplicates = sum(1 for error in errors if error.get('code') == DUPLICATE_KEY)
+                    inserted = details['nInserted'] + duplicates
+                    if inserted < len(batch):
+                        logger.warning("%d of %d results rejected by MongoDB", len(batch) - inserted, len(batch))
+                    self._record(batch, started, inserted)
+                    return
+                logger.warning("Writing %d results to MongoDB failed (attempt %d): %s", len(batch), attempt + 1, e)
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+                self._count("failed", len(batch))
+                return
+            self._record(batch, started, len(batch))
+            return
+
+    def _record(self, batch, started, inserted):
+        elapsed = time.perf_counter() - started
+        FLUSH_SECONDS.observe(elapsed)
+        BATCH_SIZE.observe(len(batch))
+        self._count("inserted", inserted)
+        if inserted < len(batch):
+            self._count("failed", len(batch) - inserted)
+        with self._lock:
+            self._counts["batches"] += 1
+            self._last_flush_ms = round(elapsed * 1000, 3)
+
+    def _run(self):
+        batch = []
+        flush_at = None
+        stopping = False
+        while not stopping:
+            timeout = self.flush_interval if flush_at is None else max(flush_at - time.monotonic(), 0)
+            try:
+                item = self._buffer.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            # Take whatever else is already waiting, up to a full batch
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if not batch:
+                    flush_at = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._buffer.get_nowait()
+                except queue.Empty:
+                    item = None
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= flush_at):
+                self._write(batch)
+                batch = []
+                flush_at = None
+        # Drain what was queued behind the stop request
+        while True:
+            try:
+                item = self._buffer.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+
+    def stats(self):
+        """Buffer depth, document counts by outcome and the duration of the last flush."""
+        with self._lock:
+            return {
+                **self._counts,
+                "buffered": self._buffer.qsize(),
+                "maxBuffered": self.max_buffered,
+                "batchSize": self.batch_size,
+                "flushInterval": self.flush_interval,
+                "lastFlushMs": self._last_flush_ms,
+            }
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import traceback
+from utilities.profiler import DEFAULT_INTERVAL, SAMPLE, Profile
+
+logger = logging.getLogger(__name__)
+
+CONTROL_FILE = 'session.json'
+
+
+class SessionActive(Exception):
+    """A profiling session is already running."""
+
+
+class SessionCoordinator:
+    """Time-boxed sampling sessions joined by every worker process.
+
+    Workers share nothing but the filesystem, so starting a session writes a
+    control file in ``directory``. A watcher thread in each process polls it
+    every ``poll_interval`` seconds, samples all of its threads until the
+    session ends (or is stopped early) and writes
+    ``session-<id>-<pid>.speedscope.json`` next to it.
+    """
+
+    def __init__(self, directory, max_seconds=60.0, poll_interval=1.0, interval=DEFAULT_INTERVAL):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self.poll_interval = poll_interval
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._watching_pid = None
+        self._last_session = None
+
+    def _control_path(self):
+        return os.path.join(self.directory, CONTROL_FILE)
+
+    def _read(self):
+        try:
+            with open(self._control_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, control):
+        os.makedirs(self.directory, exist_ok=True)
+        # Written whole and renamed, so watchers never read a partial file
+        temporary = f"{self._control_path()}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(control, f)
+        os.replace(temporary, self._control_path())
+
+    def start(self, seconds):
+        """Start a session of ``seconds`` (capped at ``max_seconds``) and return its control record."""
+        control = self._read()
+        if control is not None and control['until'] > time.time():
+            raise SessionActive(f"Session {control['id']} runs until {control['until']:.0f}")
+        now = time.time()
+        control = {
+            'id': uuid.uuid4().hex[:12],
+            'startedAt': now,
+            'until': now + min(max(seconds, 1.0), self.max_seconds),
+            'interval': self.interval,
+        }
+        self._write(control)
+        logger.info("Profiling session %s started for %.0f s", control['id'], control['until'] - now)
+        return control
+
+    def stop(self):
+        """End the running session early; returns its control record, or None if none is running."""
+        control = self._read()
+        if control is None or control['until'] <= time.time():
+            return None
+        control['until'] = time.time()
+        self._write(control)
+        return control
+
+    def status(self):
+        """The latest session, whether it is still running and the files written for it so far."""
+        control = self._read()
+        if control is None:
+            return {"session": None, "active": False, "files": []}
+        prefix = f"session-{control['id']}-"
+        try:
+            files = sorted(name for name in os.listdir(self.directory) if name.startswith(prefix))
+        except OSError:
+            files = []
+        return {"session": control, "active": control['until'] > time.time(), "files": files}
+
+    def watch(self):
+        """Start the watcher thread in this process, if it is not running yet.
+
+        Safe to call on every request: after a fork the child starts its own
+        thread, since threads don't survive fork.
+        """
+        if self._watching_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watching_pid == os.getpid():
+                return
+            threading.Thread(target=self._watch, name="profile-session-watcher", daemon=True).start()
+            self._watching_pid = os.getpid()
+
+    def _watch(self):
+        while True:
+            control = self._read()
+            if control is not None and control['id'] != self._last_session and control['until'] > time.time():
+                self._last_session = control['id']
+                try:
+                    self._record(control)
+                except Exception as e:
+                    logger.error("Profiling session %s failed: %s", control['id'], e)
+                    logger.error(traceback.format_exc())
+            time.sleep(self.poll_interval)
+
+    def _record(self, control):
+        profile = Profile(SAMPLE, control.get('interval', self.interval)).start()
+        try:
+            while True:
+                remaining = control['until'] - time.time()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, self.poll_interval))
+                # Pick up an early stop
+                latest = self._read()
+                if latest is not None and latest['id'] == control['id']:
+                    control = latest
+        finally:
+            profile.stop()
+        name = f"session-{control['id']}-{os.getpid()}{profile.extension}"
+        profile.save(os.path.join(self.directory, name), name=f"session {control['id']} pid {os.getpid()}")
+        logger.info("Profiling session %s written to %s", control['id'], name)
@@ -0,0 +1,179 @@
+"""cProfile and sampling profiles written as .prof or speedscope files.
+
+A ``.prof`` file holds cProfile statistics of the thread that started the
+profile (open it with ``python -m pstats`` or snakeviz). A
+``.speedscope.json`` file holds stack samples of every thread, taken by a
+background thread from ``sys._current_frames()``; open it at
+https://www.speedscope.app. Sampling costs nothing in the profiled threads
+and also shows time spent waiting, which cProfile attributes poorly.
+
+This module has no dependencies outside the standard library. The crop
+recommender imports this same file (backend/models/crop_recommender.py puts
+AI/utilities on its path), so keep it free of AI-service imports.
+"""
+import sys
+import json
+import time
+import cProfile
+import threading
+
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+EXTENSIONS = {CPROFILE: '.prof', SAMPLE: '.speedscope.json'}
+
+# Seconds between stack samples
+DEFAULT_INTERVAL = 0.005
+
+# cProfile can't run in two threads at once on every Python version
+_cprofile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another cProfile profile is already running in this process."""
+
+
+def kind_for_path(path):
+    """The profile kind implied by a file name: sampling for .speedscope.json, cProfile otherwise."""
+    return SAMPLE if str(path).endswith(EXTENSIONS[SAMPLE]) else CPROFILE
+
+
+class Sampler:
+    """Samples the stacks of running threads every ``interval`` seconds.
+
+    ``thread_ids`` limits sampling to those threads; by default every thread
+    but the sampler itself is sampled.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self._frame_index = {}
+        self._frames = []
+        self._samples = {}
+        self._weights = {}
+        self._thread_names = {}
+        self._stopping = threading.Event()
+        self._thread = None
+        self.duration = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(own, now - last)
+            last = now
+
+    def _sample(self, own, weight):
+        names = None
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                index = self._frame_index.get(key)
+                if index is None:
+                    index = self._frame_index[key] = len(self._frames)
+                    self._frames.append(key)
+                stack.append(index)
+                frame = frame.f_back
+            stack.reverse()
+            if thread_id not in self._samples:
+                if names is None:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self._thread_names[thread_id] = names.get(thread_id, str(thread_id))
+                self._samples[thread_id] = []
+                self._weights[thread_id] = []
+            self._samples[thread_id].append(stack)
+            self._weights[thread_id].append(weight)
+
+    def speedscope(self, name):
+        """Return the samples in the speedscope file format, one profile per thread."""
+        profiles = []
+        for thread_id, samples in self._samples.items():
+            weights = self._weights[thread_id]
+            profiles.append({
+                "type": "sampled",
+                "name": self._thread_names[thread_id],
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        # Busiest thread first, so speedscope opens on it
+        profiles.sort(key=lambda profile: -profile["endValue"])
+        if not profiles:
+            # Shorter than one interval; speedscope needs at least one profile to open the file
+            profiles.append({"type": "sampled", "name": "no samples", "unit": "seconds",
+                             "startValue": 0, "endValue": 0, "samples": [], "weights": []})
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": function, "file": file, "line": line} for function, file, line in self._frames]},
+            "profiles": profiles,
+            "name": name,
+            "activeProfileIndex": 0,
+            "exporter": "agroboost-profiler",
+        }
+
+    def save(self, path, name=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(name or str(path)), f)
+
+
+class Profile:
+    """One profile of either kind, started and stopped by the caller.
+
+    A cProfile profile covers the thread that calls ``start``; a sampling
+    profile covers ``thread_ids`` (every thread by default).
+    """
+
+    def __init__(self, kind=CPROFILE, interval=DEFAULT_INTERVAL, thread_ids=None):
+        if kind not in EXTENSIONS:
+            raise ValueError(f"Unknown profile kind: {kind}")
+        self.kind = kind
+        self.extension = EXTENSIONS[kind]
+        self._profiler = cProfile.Profile() if kind == CPROFILE else Sampler(interval, thread_ids)
+        self._locked = False
+
+    def start(self):
+        """Start profiling; raises ProfilerBusy if a cProfile profile is already running."""
+        if self.kind == CPROFILE:
+            if not _cprofile_lock.acquire(blocking=False):
+                raise ProfilerBusy("A cProfile profile is already running")
+            self._locked = True
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+        return self
+
+    def stop(self):
+        if self.kind == CPROFILE:
+            self._profiler.disable()
+            if self._locked:
+                self._locked = False
+                _cprofile_lock.release()
+        else:
+            self._profiler.stop()
+        return self
+
+    def save(self, path, name=None):
+        if self.kind == CPROFILE:
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.save(path, name)
+        return path
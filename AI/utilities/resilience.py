@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """No execution slot became free before the caller's deadline."""
+
+
+class CircuitBreaker:
+    """Fail fast once the recent failure rate of an upstream gets too high.
+
+    Outcomes from the last ``window`` seconds are kept. When at least
+    ``min_calls`` of them exist and the failure share reaches
+    ``failure_threshold`` the breaker opens and rejects calls for
+    ``reset_timeout`` seconds. It then lets a single probe through
+    (half-open): a success closes the breaker, a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=0.5, min_calls=10, window=60.0, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """Return True if a call may proceed now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                logger.info("Circuit breaker closed after a successful probe")
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            self._record(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._record(False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_threshold):
+                self._open()
+
+    def release_probe(self):
+        """Give back a half-open probe slot when the call never reached the upstream."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _record(self, ok):
+        now = self._clock()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        logger.warning("Circuit breaker opened; rejecting calls for %.0fs", self.reset_timeout)
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self._state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "rejected": self.rejected,
+            }
+
+
+class BoundedExecutor:
+    """Run calls on at most ``max_in_flight`` threads, with a bounded waiting queue.
+
+    Up to ``max_queued`` further callers wait for a slot. A caller that cannot
+    start before its deadline, or that finds the queue full, gets
+    ``Overloaded``. A call that runs past its deadline raises TimeoutError in
+    the caller. The worker thread stays busy until the call returns, so the
+    wrapped call should also have its own timeout.
+
+    The thread pool is recreated after a fork, so an executor built in a
+    preloading master process is safe to use in its workers.
+    """
+
+    def __init__(self, max_in_flight=4, max_queued=16):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        self._admission = None
+        self._slots = None
+        self.in_flight = 0
+        self.queued = 0
+        self.overloaded = 0
+
+    def _ensure_pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="bounded")
+                    self._admission = threading.BoundedSemaphore(self.max_in_flight + self.max_queued)
+                    self._slots = threading.BoundedSemaphore(self.max_in_flight)
+                    self.in_flight = self.queued = 0
+                    self._pid = os.getpid()
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Call ``fn`` on the pool and wait at most ``timeout`` seconds in total for its result."""
+        self._ensure_pool()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Reject immediately when both the running slots and the queue are taken
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self.overloaded += 1
+            raise Overloaded(f"{self.max_in_flight} calls running and {self.max_queued} queued")
+        try:
+            with self._lock:
+                self.queued += 1
+            acquired = self._slots.acquire(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            with self._lock:
+                self.queued -= 1
+                if acquired:
+                    self.in_flight += 1
+                else:
+                    self.overloaded += 1
+            if not acquired:
+                raise Overloaded("Timed out waiting for a free slot")
+
+            future = self._pool.submit(self._call, fn, args, kwargs)
+            try:
+                return future.result(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                raise TimeoutError(f"Call did not finish within {timeout}s")
+        finally:
+            self._admission.release()
+
+    def _call(self, fn, args, kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "overloaded": self.overloaded,
+            }
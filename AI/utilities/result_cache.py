@@ -0,0 +1,103 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class _Call:
+    """One in-flight computation that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """Bounded, TTL-expiring in-memory cache with request coalescing.
+
+    Concurrent ``get_or_compute`` calls for a key that is not cached share a
+    single call to ``compute``: the first caller runs it and the others wait
+    for its result or exception. Results are kept for ``ttl`` seconds, least
+    recently used first out once ``maxsize`` entries are stored. None results
+    and exceptions are never cached, so failures are retried.
+
+    Entries live only in this process's memory and are never written to disk.
+    """
+
+    def __init__(self, maxsize=256, ttl=600.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get_or_compute(self, key, compute):
+        """Return ``(value, source)``, where source is "hit", "miss" or "coalesced"."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self._clock() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, "hit"
+                del self._entries[key]
+                self.expired += 1
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, "coalesced"
+
+        try:
+            call.value = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if call.error is None and call.value is not None and self.maxsize > 0:
+                    self._entries[key] = (self._clock(), call.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+                del self._inflight[key]
+            call.done.set()
+        return call.value, "miss"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "in_flight": len(self._inflight),
+                # Share of lookups answered without a model call of their own
+                "saved_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
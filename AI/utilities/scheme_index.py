@@ -0,0 +1,206 @@
+import json
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMES_PATH = os.path.join(os.path.dirname(__file__), 'schemes.json')
+
+NORTH_EAST_STATES = [
+    "Arunachal Pradesh", "Assam", "Manipur", "Meghalaya",
+    "Mizoram", "Nagaland", "Sikkim", "Tripura"
+]
+
+# Number of serialized filter combinations kept per snapshot
+RESPONSE_CACHE_SIZE = 256
+
+
+def clean_scheme(scheme):
+    """Turn a raw scraped scheme into the record served by the API, or None to skip it."""
+    if 'Scheme Name' not in scheme or not scheme['Scheme Name'] or 'Details' not in scheme:
+        return None
+
+    scheme_name = scheme['Scheme Name'].strip()
+    details = scheme['Details'].strip()
+
+    if not scheme_name and not details:
+        return None
+
+    # Skip header row
+    if scheme_name == "Name       of       the Scheme" and details == "Purpose":
+        return None
+
+    cleaned_scheme = {
+        "name": scheme_name,
+        "description": details,
+        "category": "agriculture",  # Default category
+    }
+
+    # Categorize schemes based on keywords
+    lower_name = scheme_name.lower()
+    lower_details = details.lower()
+
+    if "kisan" in lower_name:
+        cleaned_scheme["category"] = "farmer support"
+    elif "fasal bima" in lower_name:
+        cleaned_scheme["category"] = "insurance"
+    elif "infrastructure" in lower_name or "fund" in lower_name:
+        cleaned_scheme["category"] = "infrastructure"
+    elif "irrigation" in lower_name or "water" in lower_details:
+        cleaned_scheme["category"] = "irrigation"
+    elif "organic" in lower_name:
+        cleaned_scheme["category"] = "organic farming"
+    elif "digital" in lower_name:
+        cleaned_scheme["category"] = "technology"
+
+    # Add eligibility info based on scheme details
+    cleaned_scheme["eligibility"] = {
+        "states": ["All States"],  # Default
+        "income_groups": ["All"],  # Default
+        "gender": ["All"]         # Default
+    }
+
+    # Northeast specific schemes
+    if "north eastern region" in lower_name or "north east" in lower_details:
+        cleaned_scheme["eligibility"]["states"] = list(NORTH_EAST_STATES)
+
+    # Check for gender specific schemes
+    if "women" in lower_name or "women" in lower_details or "namo drone didi" in lower_name:
+        cleaned_scheme["eligibility"]["gender"] = ["Female"]
+
+    # Income group specific (if mentioned)
+    if "small and marginal farmers" in lower_details:
+        cleaned_scheme["eligibility"]["income_groups"] = ["Low", "Lower Middle"]
+
+    return cleaned_scheme
+
+
+def _postings(records, field, open_value):
+    """Map each lower-cased eligibility value to the ids of the records that list it.
+
+    Records listing ``open_value`` (e.g. "All States") are collected separately,
+    since they match every query on that field.
+    """
+    postings = {}
+    open_ids = set()
+    for record_id, record in enumerate(records):
+        for value in record["eligibility"][field]:
+            if value == open_value:
+                open_ids.add(record_id)
+            postings.setdefault(value.lower(), set()).add(record_id)
+    return postings, open_ids
+
+
+class _Snapshot:
+    """Cleaned records and inverted postings built from one version of schemes.json."""
+
+    def __init__(self, records, mtime, source_hash):
+        self.records = records
+        self.mtime = mtime
+        self.source_hash = source_hash
+        self.all_ids = set(range(len(records)))
+
+        self.by_category = {}
+        for record_id, record in enumerate(records):
+            self.by_category.setdefault(record["category"].lower(), set()).add(record_id)
+        self.by_state, self.all_states = _postings(records, "states", "All States")
+        self.by_gender, self.all_genders = _postings(records, "gender", "All")
+        self.by_income, self.all_incomes = _postings(records, "income_groups", "All")
+
+        self.responses = OrderedDict()
+
+
+class SchemeIndex:
+    """In-memory index of cleaned schemes, rebuilt when schemes.json changes on disk.
+
+    Filtered queries intersect per-field postings instead of re-scanning the
+    schemes, and the JSON body for each filter combination is serialized
+    once and reused together with its ETag.
+    """
+
+    def __init__(self, path=SCHEMES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def refresh(self):
+        """Return the current snapshot, rebuilding it if the file's mtime changed."""
+        mtime = os.stat(self.path).st_mtime_ns
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.mtime == mtime:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.mtime != mtime:
+                snapshot = self._build(mtime)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _build(self, mtime):
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        all_schemes = json.loads(raw.decode('utf-8'))
+
+        records = []
+        for scheme in all_schemes:
+            cleaned_scheme = clean_scheme(scheme)
+            if cleaned_scheme is not None:
+                records.append(cleaned_scheme)
+
+        snapshot = _Snapshot(records, mtime, hashlib.sha1(raw).hexdigest())
+        # Serialize the unfiltered list and each category up front
+        self._render(snapshot, ("", "", "", ""))
+        for category in snapshot.by_category:
+            self._render(snapshot, ("", category, "", ""))
+
+        logger.info("Indexed %d schemes from %s", len(records), self.path)
+        return snapshot
+
+    def match_ids(self, snapshot, state="", category="", income_group="", gender=""):
+        """Return the ids of the records matching the (lower-cased) filters, in file order."""
+        candidates = snapshot.all_ids
+
+        # Category, state and income filters match as substrings, gender exactly
+        if category:
+            candidates = candidates & set().union(
+                *(ids for name, ids in snapshot.by_category.items() if category in name)
+            )
+        if state:
+            candidates = candidates & snapshot.all_states.union(
+                *(ids for name, ids in snapshot.by_state.items() if state in name)
+            )
+        if gender:
+            candidates = candidates & (snapshot.all_genders | snapshot.by_gender.get(gender, set()))
+        if income_group:
+            candidates = candidates & snapshot.all_incomes.union(
+                *(ids for name, ids in snapshot.by_income.items() if income_group in name)
+            )
+        return sorted(candidates)
+
+    def _render(self, snapshot, key):
+        ids = self.match_ids(snapshot, *key)
+        schemes = [dict(snapshot.records[record_id], id=i + 1) for i, record_id in enumerate(ids)]
+        # Same encoding as flask.jsonify outside debug mode
+        body = (json.dumps({"count": len(schemes), "schemes": schemes},
+                           sort_keys=True, separators=(',', ':')) + "\n").encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+
+        snapshot.responses[key] = (body, etag)
+        while len(snapshot.responses) > RESPONSE_CACHE_SIZE:
+            snapshot.responses.popitem(last=False)
+        return body, etag
+
+    def response(self, state="", category="", income_group="", gender=""):
+        """Return the serialized JSON body and ETag for a filter combination."""
+        snapshot = self.refresh()
+        key = (state, category, income_group, gender)
+        with self._lock:
+            cached = snapshot.responses.get(key)
+            if cached is not None:
+                snapshot.responses.move_to_end(key)
+                return cached
+            return self._render(snapshot, key)
@@ -0,0 +1,180 @@
+import re
+import os
+import gzip
+import json
+import math
+import heapq
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = os.path.join(os.path.dirname(__file__), 'schemes.search.json.gz')
+INDEX_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# A term in the scheme name counts as much as this many occurrences in the details
+NAME_WEIGHT = 3
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in into is it its of on or that the
+their to under was were which will with this these those per all any can
+""".split())
+
+IRREGULAR = {"women": "woman", "men": "man", "children": "child"}
+
+
+def stem(word):
+    """Strip common English suffixes so 'subsidies', 'subsidy' and 'subsidised' share a term."""
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in (("ies", "y"), ("sses", "ss"), ("ised", "y"), ("ized", "y"),
+                                ("ing", ""), ("ed", ""), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "s" and word.endswith("ss"):
+                return word
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text):
+    """Lower-case, split on non-alphanumerics, drop stopwords and stem."""
+    return [stem(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _term_frequencies(record):
+    frequencies = {}
+    for token in tokenize(record["name"]):
+        frequencies[token] = frequencies.get(token, 0) + NAME_WEIGHT
+    for token in tokenize(record["description"]):
+        frequencies[token] = frequencies.get(token, 0) + 1
+    return frequencies
+
+
+class SchemeSearch:
+    """BM25 full-text search over the cleaned schemes of a SchemeIndex.
+
+    The inverted index (term -> record ids and term frequencies) is persisted
+    next to schemes.json and reused as long as the source hash matches, so
+    restarts skip tokenization. BM25 weights are computed once per load,
+    which makes a query a handful of dictionary lookups and a top-k heap.
+    """
+
+    def __init__(self, scheme_index, path=SEARCH_INDEX_PATH):
+        self.scheme_index = scheme_index
+        self.path = path
+        self._lock = threading.Lock()
+        # (source_hash, weights), replaced as one so readers never pair a snapshot with another version's weights
+        self._current = (None, {})
+
+    def refresh(self):
+        """Return the snapshot searched and the BM25 weights built from it.
+
+        The index is reloaded if schemes.json changed.
+        """
+        snapshot = self.scheme_index.refresh()
+        source_hash, weights = self._current
+        if source_hash != snapshot.source_hash:
+            with self._lock:
+                source_hash, weights = self._current
+                if source_hash != snapshot.source_hash:
+                    index = self._load(snapshot) or self._build(snapshot)
+                    weights = self._bm25_weights(index)
+                    self._current = (snapshot.source_hash, weights)
+        return snapshot, weights
+
+    def _load(self, snapshot):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable search index %s: %s", self.path, e)
+            return None
+        if index.get("version") != INDEX_VERSION or index.get("source_hash") != snapshot.source_hash:
+            return None
+        return index
+
+    def _build(self, snapshot):
+        postings = {}
+        doc_lengths = []
+        for record_id, record in enumerate(snapshot.records):
+            frequencies = _term_frequencies(record)
+            doc_lengths.append(sum(frequencies.values()))
+            for term, frequency in frequencies.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(record_id)
+                tfs.append(frequency)
+
+        index = {
+            "version": INDEX_VERSION,
+            "source_hash": snapshot.source_hash,
+            "doc_lengths": doc_lengths,
+            "postings": postings,
+        }
+        self._save(index)
+        logger.info("Built search index with %d terms over %d schemes", len(postings), len(doc_lengths))
+        return index
+
+    def _save(self, index):
+        # Write to a temporary file and rename so readers never see a partial index
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(index, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not persist search index to %s: %s", self.path, e)
+
+    @staticmethod
+    def _bm25_weights(index):
+        """Precompute the BM25 contribution of every (term, record) pair."""
+        doc_lengths = index["doc_lengths"]
+        n_docs = len(doc_lengths)
+        average_length = (sum(doc_lengths) / n_docs) if n_docs else 1.0
+
+        weights = {}
+        for term, (ids, tfs) in index["postings"].items():
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            weights[term] = [
+                (record_id, idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_lengths[record_id] / average_length)))
+                for record_id, tf in zip(ids, tfs)
+            ]
+        return weights
+
+    def search(self, query, page=1, per_page=10, state="", category="", income_group="", gender=""):
+        """Rank schemes for ``query``, restricted to the records passing the filters."""
+        snapshot, weights = self.refresh()
+
+        allowed = None
+        if state or category or income_group or gender:
+            allowed = set(self.scheme_index.match_ids(snapshot, state, category, income_group, gender))
+
+        scores = {}
+        for term in set(tokenize(query)):
+            for record_id, weight in weights.get(term, ()):
+                if allowed is None or record_id in allowed:
+                    scores[record_id] = scores.get(record_id, 0.0) + weight
+
+        offset = (page - 1) * per_page
+        ranked = heapq.nlargest(offset + per_page, scores.items(), key=lambda item: (item[1], -item[0]))
+        results = [
+            dict(snapshot.records[record_id], id=record_id + 1, score=round(score, 4))
+            for record_id, score in ranked[offset:]
+        ]
+        return {
+            "query": query,
+            "count": len(scores),
+            "page": page,
+            "per_page": per_page,
+            "results": results,
+        }
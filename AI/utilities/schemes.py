@@ -1,30 +1,211 @@
-from bs4 import BeautifulSoup
-import requests
+import os
+import sys
 import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PIB_URL = 'https://pib.gov.in/PressReleaseIframePage.aspx?PRID={prid}'
+DEFAULT_PRIDS = ['2002012']
+
+SCHEMES_PATH = os.path.join(os.path.dirname(__file__), 'schemes.json')
+# Per press release: ETag, Last-Modified and content hash of the last fetch
+STATE_PATH = os.path.join(os.path.dirname(__file__), 'schemes_scrape_state.json')
+
+
+def create_session(pool_size=8):
+    """Return a requests session whose connection pool fits ``pool_size`` concurrent fetches."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_schemes(html_text):
+    """Extract scheme names and details from a PIB press release page."""
+    soup = BeautifulSoup(html_text, 'lxml')
+
+    scheme_names = soup.find_all('td', style='width:108.6pt')
+    scheme_details = soup.find_all('td', style='width:336.85pt')
+
+    schemes = []
+    for name, detail in zip(scheme_names, scheme_details):
+        scheme_name = name.get_text(strip=True)
+
+        paragraphs = detail.find_all('p')
+        scheme_detail = "\n\n".join(p.get_text(strip=True) for p in paragraphs) if paragraphs else detail.get_text(strip=True)
+
+        schemes.append({'Scheme Name': scheme_name, 'Details': scheme_detail})
+    return schemes
+
+
+def fetch_press_release(session, prid, previous, url_template=PIB_URL, timeout=30):
+    """Fetch and parse one press release, skipping work that previous runs already did.
+
+    ``previous`` is the stored state for this release. It supplies the
+    If-None-Match / If-Modified-Since headers, and its content hash lets an
+    unchanged body skip parsing even when the server ignores them.
+    """
+    headers = {}
+    if previous.get('etag'):
+        headers['If-None-Match'] = previous['etag']
+    if previous.get('last_modified'):
+        headers['If-Modified-Since'] = previous['last_modified']
+
+    result = {'prid': prid, 'status': 'error', 'schemes': [], 'state': previous,
+              'fetch_seconds': 0.0, 'parse_seconds': 0.0}
+    started = time.perf_counter()
+    try:
+        response = session.get(url_template.format(prid=prid), headers=headers, timeout=timeout)
+        body = response.content
+    except requests.RequestException as e:
+        result['fetch_seconds'] = time.perf_counter() - started
+        result['error'] = str(e)
+        logger.error("Fetching press release %s failed: %s", prid, e)
+        return result
+    result['fetch_seconds'] = time.perf_counter() - started
+
+    if response.status_code == 304:
+        result['status'] = 'not-modified'
+        return result
+    if response.status_code != 200:
+        result['error'] = f"HTTP {response.status_code}"
+        logger.error("Fetching press release %s returned HTTP %s", prid, response.status_code)
+        return result
+
+    content_hash = hashlib.sha256(body).hexdigest()
+    result['state'] = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_hash': content_hash,
+    }
+    if content_hash == previous.get('content_hash'):
+        result['status'] = 'unchanged'
+        return result
+
+    started = time.perf_counter()
+    result['schemes'] = parse_schemes(response.text)
+    result['parse_seconds'] = time.perf_counter() - started
+    result['status'] = 'updated'
+    return result
+
+
+def scrape(prids, state=None, session=None, workers=8, url_template=PIB_URL, timeout=30):
+    """Fetch press releases concurrently over one pooled session.
+
+    Returns the per-release results and the updated state. Releases that fail
+    keep their previous state so the next run retries them.
+    """
+    state = dict(state or {})
+    session = session or create_session(workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda prid: fetch_press_release(session, prid, state.get(prid, {}), url_template, timeout),
+            prids
+        ))
+
+    for result in results:
+        if result['status'] != 'error':
+            state[result['prid']] = result['state']
+    return results, state
+
+
+def merge_schemes(existing, scraped):
+    """Merge scraped schemes into the existing list.
+
+    A scraped scheme replaces the existing entry with the same name in place
+    and new names are appended; every other existing entry is kept as is.
+    """
+    scraped_by_name = {}
+    for scheme in scraped:
+        scraped_by_name[scheme['Scheme Name'].strip()] = scheme
+
+    merged = []
+    replaced = set()
+    for scheme in existing:
+        name = scheme.get('Scheme Name', '').strip()
+        if name not in scraped_by_name:
+            merged.append(scheme)
+        elif name not in replaced:
+            merged.append(scraped_by_name[name])
+            replaced.add(name)
+    merged.extend(scheme for name, scheme in scraped_by_name.items() if name not in replaced)
+    return merged
 
 
-url = 'https://pib.gov.in/PressReleaseIframePage.aspx?PRID=2002012'
-html_text = requests.get(url).text
-soup = BeautifulSoup(html_text, 'lxml')
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file in the same directory, then rename it over ``path``."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.chmod(tmp_path, 0o664)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
-# testing purpose
-scheme_names = soup.find_all('td', style='width:108.6pt')
-scheme_details = soup.find_all('td', style='width:336.85pt')
 
+def _read_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
 
-schemes = []
 
+def update_schemes(prids, schemes_path=SCHEMES_PATH, state_path=STATE_PATH, **scrape_options):
+    """Scrape ``prids`` and merge any new or changed schemes into ``schemes_path``."""
+    started = time.perf_counter()
+    results, state = scrape(prids, _read_json(state_path, {}), **scrape_options)
 
-for name, detail in zip(scheme_names, scheme_details):
-    scheme_name = name.get_text(strip=True)
+    scraped = [scheme for result in results for scheme in result['schemes']]
+    if scraped:
+        write_json_atomic(schemes_path, merge_schemes(_read_json(schemes_path, []), scraped))
+    write_json_atomic(state_path, state)
 
-    paragraphs = detail.find_all('p')
-    scheme_detail = "\n\n".join(p.get_text(strip=True) for p in paragraphs) if paragraphs else detail.get_text(strip=True)
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+    return {
+        'releases': len(results),
+        'statuses': statuses,
+        'schemes_scraped': len(scraped),
+        'errors': {result['prid']: result['error'] for result in results if 'error' in result},
+        'fetch_seconds': round(sum(result['fetch_seconds'] for result in results), 3),
+        'parse_seconds': round(sum(result['parse_seconds'] for result in results), 3),
+        'wall_seconds': round(time.perf_counter() - started, 3),
+    }
 
-    schemes.append({'Scheme Name': scheme_name, 'Details': scheme_detail})
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape agricultural schemes from PIB press releases")
+    parser.add_argument('prids', nargs='*', default=DEFAULT_PRIDS, help="PIB press release IDs")
+    parser.add_argument('--output', default=SCHEMES_PATH, help="schemes JSON file to merge into")
+    parser.add_argument('--state', default=STATE_PATH, help="conditional request state file")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent fetches")
+    parser.add_argument('--url-template', default=PIB_URL,
+                        help="press release URL with a {prid} placeholder, e.g. a local mirror")
+    parser.add_argument('--timeout', type=float, default=30, help="per-request timeout in seconds")
+    args = parser.parse_args(argv)
 
-json_data = json.dumps(schemes, indent=4, ensure_ascii=False)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    summary = update_schemes(args.prids, args.output, args.state, workers=args.workers,
+                             url_template=args.url_template, timeout=args.timeout)
+    print(json.dumps(summary, indent=4))
+    return 1 if summary['errors'] else 0
 
 
-print(json_data)
+if __name__ == '__main__':
+    sys.exit(main())
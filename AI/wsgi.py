@@ -0,0 +1,14 @@
+import gc
+import logging
+
+from app import app
+
+logger = logging.getLogger(__name__)
+
+# With preload_app the master imports this module once, so the routes,
+# the schemes and search indexes and the Gemini SDK are loaded before the
+# workers fork and shared copy-on-write. Freezing moves everything allocated
+# so far out of the collector's reach; otherwise each worker's first
+# collection touches those objects and copies the pages they live on.
+gc.freeze()
+logger.info("WSGI app loaded (ready: %s)", app.config['READY'])
@@ -0,0 +1,224 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import os
+from pathlib import Path
+
+# Get the directory of the current script
+script_dir = Path(__file__).parent.absolute()
+
+DEFAULT_MODEL_PATH = os.path.join(script_dir, 'crop_recommendation_model.pkl')
+DEFAULT_EXPORT_DIR = os.path.join(script_dir, 'crop_model_compact')
+
+# Flat node arrays written by export_model, one .npy file each
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+class CompactForest:
+    """Tree ensemble stored as flat node arrays shared by all trees.
+
+    Node ``i`` tests ``x[feature[i]] <= threshold[i]`` and continues at
+    ``left[i]`` or ``right[i]``; leaves have ``left == right == -1``.
+    ``value[i]`` holds the class distribution of node ``i`` normalized to sum
+    to one, and ``roots[t]`` is the index of the root of tree ``t``. Inference
+    mirrors sklearn exactly: inputs are compared as float32 and per-tree
+    probabilities are summed in tree order before averaging.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.classes_ = np.asarray(meta['classes'])
+        self.n_features_in_ = meta['n_features']
+        self.n_trees = len(self.roots)
+        self.max_depth = meta['max_depth']
+
+    def _check_input(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected an (n, {self.n_features_in_}) input matrix, got shape {X.shape}")
+        return X
+
+    def apply(self, X):
+        """Return the leaf reached in every tree, as an (n, n_trees) array of node indices."""
+        X = self._check_input(X)
+        n = len(X)
+        leaves = np.empty((n, self.n_trees), dtype=np.int64)
+
+        for t, root in enumerate(self.roots):
+            node = np.full(n, root, dtype=np.int64)
+            active = np.arange(n)
+            # Advance the rows still at internal nodes one level per iteration
+            while active.size:
+                current = node[active]
+                left = self.left[current]
+                internal = left >= 0
+                active, current, left = active[internal], current[internal], left[internal]
+                go_left = X[active, self.feature[current]] <= self.threshold[current]
+                node[active] = np.where(go_left, left, self.right[current])
+            leaves[:, t] = node
+        return leaves
+
+    def predict_proba(self, X):
+        """Return class probabilities identical to the source model's predict_proba."""
+        leaves = self.apply(X)
+        proba = np.zeros((len(leaves), len(self.classes_)), dtype=np.float64)
+        for t in range(self.n_trees):
+            proba += self.value[leaves[:, t]]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        """Return the most probable class for every row."""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def load_sklearn_model(model_path=DEFAULT_MODEL_PATH):
+    """Load the pickled sklearn model (written with joblib.dump)."""
+    import joblib
+    return joblib.load(model_path)
+
+def flatten_forest(model):
+    """Concatenate the nodes of every tree in a fitted forest into flat arrays."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        # Node values are (weighted) class counts; normalize them the way
+        # DecisionTreeClassifier.predict_proba does
+        counts = tree.value[:, 0, :]
+        normalizer = counts.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, -1, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+        values.append(counts / normalizer)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(np.int32),
+        'right': np.concatenate(rights).astype(np.int32),
+        'value': np.concatenate(values).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+    }
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'classes': model.classes_.tolist(),
+        'n_features': int(model.n_features_in_),
+        'n_trees': len(roots),
+        'n_nodes': int(offset),
+        'max_depth': int(max_depth),
+    }
+    return arrays, meta
+
+def export_model(model, output_dir=DEFAULT_EXPORT_DIR):
+    """Write a fitted forest as .npy node arrays plus meta.json; returns the metadata."""
+    import sklearn
+
+    arrays, meta = flatten_forest(model)
+    meta['sklearn_version'] = sklearn.__version__
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(output_dir, f'{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(output_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    meta['bytes'] = sum(os.path.getsize(os.path.join(output_dir, f'{name}.npy')) for name in ARRAY_NAMES)
+    return meta
+
+def load_compact_model(model_dir=DEFAULT_EXPORT_DIR, mmap=True):
+    """Load an exported model, memory-mapping the node arrays by default.
+
+    Memory-mapped arrays are read straight from the page cache, so worker
+    processes loading the same export share one physical copy.
+    """
+    with open(os.path.join(model_dir, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model format: {meta.get('format_version')}")
+
+    arrays = {}
+    for name in ARRAY_NAMES:
+        array = np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode='r' if mmap else None)
+        # A plain ndarray view avoids np.memmap overhead on every fancy index
+        arrays[name] = array.view(np.ndarray)
+    return CompactForest(arrays, meta)
+
+def sample_inputs(forest, rows, seed=0):
+    """Draw rows spanning the range of split thresholds used by the forest."""
+    rng = np.random.default_rng(seed)
+    internal = forest.left >= 0
+    columns = []
+    for f in range(forest.n_features_in_):
+        thresholds = forest.threshold[internal & (forest.feature == f)]
+        if thresholds.size == 0:
+            columns.append(rng.normal(size=rows))
+            continue
+        low, high = thresholds.min(), thresholds.max()
+        margin = max(high - low, 1.0) * 0.1
+        columns.append(rng.uniform(low - margin, high + margin, size=rows))
+    return np.column_stack(columns)
+
+def validate(model, forest, X):
+    """Compare the compact model against the sklearn model on ``X``."""
+    expected = model.predict_proba(X)
+    actual = forest.predict_proba(X)
+    return {
+        'rows': int(len(X)),
+        'identical': bool(np.array_equal(expected, actual)),
+        'maxAbsDiff': float(np.max(np.abs(expected - actual))) if len(X) else 0.0,
+        'predictionAgreement': float(np.mean(model.predict(X) == forest.predict(X))) if len(X) else 1.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and validate the compact crop model")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="convert the pickled model to flat .npy arrays")
+    export_parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled sklearn model")
+    export_parser.add_argument('--output', default=DEFAULT_EXPORT_DIR, help="export directory")
+
+    validate_parser = subparsers.add_parser('validate', help="check the export agrees with the sklearn model")
+    validate_parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled sklearn model")
+    validate_parser.add_argument('--compact', default=DEFAULT_EXPORT_DIR, help="export directory")
+    validate_parser.add_argument('--rows', type=int, default=10000, help="random rows to compare")
+    validate_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    model = load_sklearn_model(args.model)
+    pickle_seconds = time.perf_counter() - started
+
+    if args.command == 'export':
+        meta = export_model(model, args.output)
+        print(json.dumps({'success': True, 'output': args.output, **meta}))
+        return 0
+
+    started = time.perf_counter()
+    forest = load_compact_model(args.compact)
+    mmap_seconds = time.perf_counter() - started
+
+    report = validate(model, forest, sample_inputs(forest, args.rows, args.seed))
+    report['success'] = report['identical']
+    report['loadSeconds'] = {'pickle': round(pickle_seconds, 4), 'mmap': round(mmap_seconds, 4)}
+    print(json.dumps(report))
+    if not report['identical']:
+        print("Compact model does not match the sklearn model", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,105 @@
 import sys
+import csv
 import json
+import time
 import pickle
+import hashlib
+import sqlite3
+import argparse
+import threading
 import numpy as np
 import os
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 # Get the directory of the current script
 script_dir = Path(__file__).parent.absolute()
 
+# The metrics and profiler modules are shared with the AI service, which
+# keeps the one copy; appended so modules next to this script still win
+sys.path.append(str(script_dir.parent.parent / 'AI' / 'utilities'))
+try:
+    from metrics import REGISTRY, Counter, Histogram
+except ImportError:
+    # Deployed without the AI service tree: predictions must keep working, only unmeasured
+    class _NoMetric:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, *values):
+            return self
+
+        def inc(self, amount=1):
+            pass
+
+        def observe(self, value):
+            pass
+
+    class _NoRegistry:
+        def render(self):
+            return "# metrics unavailable: AI/utilities/metrics.py not found\n"
+
+    Counter = Histogram = _NoMetric
+    REGISTRY = _NoRegistry()
+
+# Input fields in the column order the model was trained on
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Process-wide model, loaded once and reused by every prediction
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+# Process-wide prediction cache, configured from the environment on first use
+_cache = None
+_cache_configured = False
+
+# Process-wide lookup grid, configured from the environment on first use
+_grid = None
+_grid_configured = False
+
+# Process-wide explainer, built from the loaded model on first use
+_explainer = None
+_explainer_model = None
+
+# Worker metrics, exported through the "metrics" op of serve()
+PREDICTIONS = Counter('crop_predictions_total', "Predictions served, by source and cache use.",
+                      ('source', 'cached'))
+PREDICTION_SECONDS = Histogram('crop_prediction_duration_seconds', "Time to answer one prediction request.",
+                               ('cached',))
+REQUEST_ERRORS = Counter('crop_request_errors_total', "Worker requests that failed.")
+
 def load_model():
-    """Load the trained model from a pickle file."""
+    """Load the trained model with the engine named by CROP_MODEL_ENGINE.
+
+    ``sklearn`` (the default and the reference) unpickles the sklearn model.
+    ``compact`` memory-maps the flat-array export written by
+    ``compact_model.py export``. ``vectorized`` runs the level-synchronous
+    NumPy engine from forest_engine.py over that export, building it from the
+    pickle when no export exists.
+
+    The model only answers together with its metadata (``model_meta.py``;
+    CROP_MODEL_META overrides the path): the crop names of its classes and
+    the scaler of its inputs. Without it the model is not used and every
+    prediction takes the rule-based fallback.
+    """
     try:
+        engine = os.environ.get('CROP_MODEL_ENGINE', 'sklearn')
+        if engine in ('compact', 'vectorized'):
+            from compact_model import DEFAULT_EXPORT_DIR, load_compact_model
+            model_dir = os.environ.get('CROP_COMPACT_MODEL_DIR', DEFAULT_EXPORT_DIR)
+            print(f"Trying to load {engine} model from: {model_dir}", file=sys.stderr)
+            if engine == 'compact':
+                model = load_compact_model(model_dir)
+            else:
+                from forest_engine import load_engine
+                model = load_engine(model_dir)
+            print(f"{engine.capitalize()} model loaded successfully", file=sys.stderr)
+            return attach_meta(model)
+        if engine != 'sklearn':
+            raise ValueError(f"Unknown CROP_MODEL_ENGINE: {engine}")
+        
         model_path = os.path.join(script_dir, 'crop_recommendation_model.pkl')
         # Use stderr for logging instead of stdout
         print(f"Trying to load model from: {model_path}", file=sys.stderr)
@@ -18,21 +107,278 @@ def load_model():
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model file not found at {model_path}")
         
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
+        try:
+            # The model was saved with joblib.dump, which plain pickle cannot read
+            import joblib
+            model = joblib.load(model_path)
+        except ImportError:
+            with open(model_path, 'rb') as f:
+                model = pickle.load(f)
             
         print("Model loaded successfully", file=sys.stderr)
-        return model
+        return attach_meta(model)
     except Exception as e:
         error_msg = f"Error loading model: {str(e)}"
         print(error_msg, file=sys.stderr)
         return None  # Return None instead of raising, so we can use the fallback
 
-def predict_crop(N, P, K, temperature, humidity, ph, rainfall):
-    """Make crop predictions based on input parameters."""
+def attach_meta(model):
+    """Wrap a loaded estimator with its crop names and input scaler."""
+    from model_meta import DEFAULT_META_PATH, load_meta, wrap_model
+    meta_path = os.environ.get('CROP_MODEL_META', DEFAULT_META_PATH)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"Model metadata not found at {meta_path}; "
+                                "the model's crop names and input scaling are unknown")
+    return wrap_model(model, load_meta(meta_path, FEATURES))
+
+def get_model():
+    """Return the process-wide model, loading it on first use."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                _model = load_model()
+                _model_loaded = True
+    return _model
+
+def parse_input(input_data):
+    """Convert a request dict into the seven model inputs, defaulting missing fields to 0."""
+    return tuple(float(input_data.get(name, 0)) for name in FEATURES)
+
+class PredictionCache:
+    """LRU cache of prediction results keyed on inputs rounded to ``precision`` decimals.
+
+    Entries older than ``ttl`` seconds are treated as misses. When ``path`` is
+    given, entries are mirrored to a sqlite file so a recycled worker starts
+    with the previous worker's cache. Rows on disk are tagged with
+    ``namespace`` (the model fingerprint); rows from any other namespace are
+    deleted when the file is opened, so a retrained model never serves the
+    old model's answers.
+    """
+
+    def __init__(self, maxsize=4096, precision=1, ttl=None, path=None, namespace=""):
+        self.maxsize = maxsize
+        self.precision = precision
+        self.ttl = ttl
+        self.path = path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, result TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM predictions WHERE key NOT LIKE ?", (f"{namespace}:%",))
+
+    def key(self, values):
+        """Quantize the seven inputs into a cache key."""
+        return tuple(round(float(value), self.precision) for value in values)
+
+    def _db_key(self, key):
+        return f"{self.namespace}:{json.dumps(key)}"
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key):
+        """Return the cached result for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            
+            # Fall back to the on-disk store, promoting hits into memory
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT stored_at, result FROM predictions WHERE key = ?", (self._db_key(key),)
+                ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    result = json.loads(row[1])
+                    self._store(key, row[0], result)
+                    self.hits += 1
+                    return result
+            
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        """Cache ``result`` for ``key``, evicting the least recently used entries."""
+        stored_at = time.time()
+        with self._lock:
+            self._store(key, stored_at, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, stored_at, result) VALUES (?, ?, ?)",
+                    (self._db_key(key), stored_at, json.dumps(result))
+                )
+
+    def _store(self, key, stored_at, result):
+        self._entries[key] = (stored_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE key = ?", (self._db_key(evicted),))
+
+    def stats(self):
+        """Return the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "precision": self.precision,
+                "ttl": self.ttl,
+                "path": self.path,
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def model_fingerprint():
+    """The CROP_MODEL_ENGINE name and a digest of the model files it loads and their metadata.
+
+    Missing files count as empty, so the fingerprint always exists; only
+    model answers are cached, and those need the files.
+    """
+    from lookup_grid import file_fingerprint
+    engine = os.environ.get('CROP_MODEL_ENGINE', 'sklearn')
+    paths = [os.path.join(script_dir, 'crop_recommendation_model.pkl')]
+    if engine in ('compact', 'vectorized'):
+        from compact_model import ARRAY_NAMES, DEFAULT_EXPORT_DIR, META_FILE
+        model_dir = os.environ.get('CROP_COMPACT_MODEL_DIR', DEFAULT_EXPORT_DIR)
+        if engine == 'compact' or os.path.exists(os.path.join(model_dir, META_FILE)):
+            paths = [os.path.join(model_dir, name) for name in (META_FILE, *(f'{a}.npy' for a in ARRAY_NAMES))]
+    from model_meta import DEFAULT_META_PATH
+    paths.append(os.environ.get('CROP_MODEL_META', DEFAULT_META_PATH))
+    digests = []
+    for path in paths:
+        try:
+            digests.append(file_fingerprint(path))
+        except OSError:
+            digests.append('missing')
+    combined = hashlib.sha256(''.join(digests).encode('ascii')).hexdigest()
+    return f"{engine}-{combined[:16]}"
+
+def get_cache():
+    """Return the process-wide prediction cache, or None when it is disabled.
+
+    Configured by CROP_CACHE_SIZE (0 disables), CROP_CACHE_PRECISION,
+    CROP_CACHE_TTL (seconds, 0 for no expiry) and CROP_CACHE_PATH. The
+    on-disk cache is namespaced by ``model_fingerprint()``.
+    """
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _model_lock:
+            if not _cache_configured:
+                maxsize = int(os.environ.get("CROP_CACHE_SIZE", 4096))
+                ttl = float(os.environ.get("CROP_CACHE_TTL", 0)) or None
+                if maxsize > 0:
+                    path = os.environ.get("CROP_CACHE_PATH") or None
+                    _cache = PredictionCache(
+                        maxsize=maxsize,
+                        precision=int(os.environ.get("CROP_CACHE_PRECISION", 1)),
+                        ttl=ttl,
+                        path=path,
+                        namespace=model_fingerprint() if path else ""
+                    )
+                _cache_configured = True
+    return _cache
+
+def get_grid():
+    """Return the process-wide lookup grid, or None when it is disabled.
+
+    Configured by CROP_LOOKUP_GRID (a directory written by ``lookup_grid.py
+    build``; unset disables the grid) and CROP_LOOKUP_MIN_MARGIN, which
+    overrides the margin the grid was built with. A grid that fails to load
+    is reported and disabled, so predictions keep using the live model.
+    """
+    global _grid, _grid_configured
+    if not _grid_configured:
+        with _model_lock:
+            if not _grid_configured:
+                grid_dir = os.environ.get("CROP_LOOKUP_GRID")
+                if grid_dir:
+                    try:
+                        from lookup_grid import load_grid
+                        min_margin = os.environ.get("CROP_LOOKUP_MIN_MARGIN")
+                        _grid = load_grid(grid_dir, float(min_margin) if min_margin else None)
+                        print(f"Lookup grid loaded from {grid_dir}: {len(_grid.classes)} cells", file=sys.stderr)
+                    except Exception as e:
+                        print(f"Error loading lookup grid: {str(e)}", file=sys.stderr)
+                _grid_configured = True
+    return _grid
+
+def lookup_result(grid, classes, confidences):
+    """Build a prediction result from a grid answer, in the format of ``predict_crops_batch``."""
+    names = [grid.class_names[i] for i in classes]
+    return {
+        "success": True,
+        "predictedCrop": names[0],
+        "recommendations": [
+            {"name": name, "confidence": confidence, "suitability": suitability_label(confidence)}
+            for name, confidence in zip(names, confidences)
+        ],
+        "source": "model",
+        "lookup": True
+    }
+
+def predict_crop(N, P, K, temperature, humidity, ph, rainfall, explain=False):
+    """Make crop predictions, serving repeated (quantized) inputs from the cache.
+
+    When a lookup grid is configured, inputs it covers are answered from the
+    grid without running the model. With ``explain`` the model is always run,
+    and the result carries the explanation of ``explain_crops_batch``.
+    """
+    values = (N, P, K, temperature, humidity, ph, rainfall)
+    if explain:
+        try:
+            return {**explain_crops_batch(np.array([values], dtype=float))[0], "cached": False}
+        except Exception as e:
+            print(f"Explanation failed, predicting without it: {str(e)}", file=sys.stderr)
+    
+    grid = get_grid()
+    if grid is not None:
+        found = grid.lookup(values)
+        if found is not None:
+            return {**lookup_result(grid, *found), "cached": False}
+    
+    cache = get_cache()
+    if cache is None:
+        return {**_predict_crop(*values), "cached": False}
+    
+    key = cache.key(values)
+    result = cache.get(key)
+    if result is not None:
+        return {**result, "cached": True}
+    
+    result = _predict_crop(*values)
+    # Rule-based fallback answers are never cached, so a worker that failed to load the model can't poison the cache
+    if result.get("success") and result.get("source") == "model":
+        cache.put(key, result)
+    return {**result, "cached": False}
+
+def _predict_crop(N, P, K, temperature, humidity, ph, rainfall):
+    """Run the model, or the rule-based fallback, without consulting the cache."""
     try:
-        # Load the model
-        model = load_model()
+        # Reuse the already loaded model
+        model = get_model()
         
         # If model loading failed, use rule-based fallback
         if model is None:
@@ -43,46 +389,16 @@ def predict_crop(N, P, K, temperature, humidity, ph, rainfall):
         input_data = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
         print(f"Input data shape: {input_data.shape}", file=sys.stderr)
         
-        # Make prediction
-        prediction = model.predict(input_data)[0]
-        print(f"Prediction result: {prediction}", file=sys.stderr)
-        
-        # Try to get probability scores if model supports it
+        # One predict_proba pass gives both the predicted class and the ranking
         try:
-            probabilities = model.predict_proba(input_data)[0]
-            class_labels = model.classes_
-            
-            # Create list of crops with confidence scores
-            crop_confidence = [
-                {"name": str(label), "confidence": round(float(prob) * 100, 2)}
-                for label, prob in zip(class_labels, probabilities)
-            ]
-            
-            # Sort by confidence
-            crop_confidence.sort(key=lambda x: x["confidence"], reverse=True)
-            top_recommendations = crop_confidence[:5]
-            
-            # Add suitability labels
-            for crop in top_recommendations:
-                if crop["confidence"] >= 70:
-                    crop["suitability"] = "Highly Suitable"
-                elif crop["confidence"] >= 40:
-                    crop["suitability"] = "Suitable"
-                elif crop["confidence"] >= 20:
-                    crop["suitability"] = "Moderately Suitable"
-                else:
-                    crop["suitability"] = "Low Suitability"
-                    
-            return {
-                "success": True,
-                "predictedCrop": str(prediction),
-                "recommendations": top_recommendations,
-                "source": "model"
-            }
+            result = predict_crops_batch(input_data, model=model)[0]
+            print(f"Prediction result: {result['predictedCrop']}", file=sys.stderr)
+            return result
             
         except Exception as prob_error:
             # If probability prediction fails, just return the basic prediction
             print(f"Probability prediction failed: {str(prob_error)}", file=sys.stderr)
+            prediction = model.predict(input_data)[0]
             return {
                 "success": True,
                 "predictedCrop": str(prediction),
@@ -97,6 +413,172 @@ def predict_crop(N, P, K, temperature, humidity, ph, rainfall):
         # Use rule-based fallback recommendations
         return get_rule_based_recommendations(N, P, K, temperature, humidity, ph, rainfall)
 
+def to_matrix(inputs):
+    """Return inputs as an (n, 7) float array.
+
+    Accepts an (n, 7) matrix (or a single row) or a list of input dicts.
+    """
+    if isinstance(inputs, np.ndarray):
+        matrix = inputs.astype(float, copy=False)
+    elif len(inputs) > 0 and isinstance(inputs[0], dict):
+        matrix = np.array([parse_input(item) for item in inputs], dtype=float)
+    else:
+        matrix = np.asarray(inputs, dtype=float)
+    
+    if matrix.size == 0:
+        return matrix.reshape(0, len(FEATURES))
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2 or matrix.shape[1] != len(FEATURES):
+        raise ValueError(f"Expected an (n, {len(FEATURES)}) input matrix, got shape {matrix.shape}")
+    return matrix
+
+def score_matrix(model, matrix, top_k=5):
+    """Rank the classes for every row with a single predict_proba pass.
+
+    Returns the predicted labels, the top-k class indices (best first) and
+    their confidences as percentages rounded to two decimals.
+    """
+    probabilities = model.predict_proba(matrix)
+    top, confidences = rank_probabilities(probabilities, top_k)
+    predicted = model.classes_[np.argmax(probabilities, axis=1)]
+    return predicted, top, confidences
+
+def rank_probabilities(probabilities, top_k=5):
+    """Return the top-k class indices of every row (best first) and their confidences in percent."""
+    n_classes = probabilities.shape[1]
+    k = min(top_k, n_classes)
+    
+    # Rank on confidence in hundredths of a percent, breaking ties by class
+    # order, so the ranking matches a stable sort of the rounded confidences
+    hundredths = np.rint(probabilities * 10000).astype(np.int64)
+    keys = hundredths * n_classes + (n_classes - 1 - np.arange(n_classes))
+    if k < n_classes:
+        top = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n_classes), keys.shape)
+    order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(hundredths, top, axis=1) / 100
+
+# Suitability label for confidences (in percent) at or above each bound
+SUITABILITY = ((70, "Highly Suitable"), (40, "Suitable"), (20, "Moderately Suitable"))
+
+def suitability_labels(confidences):
+    """Map confidence percentages to suitability labels."""
+    return np.select(
+        [confidences >= bound for bound, _ in SUITABILITY],
+        [label for _, label in SUITABILITY],
+        default="Low Suitability"
+    )
+
+def suitability_label(confidence):
+    """``suitability_labels`` for a single confidence, without the array overhead."""
+    for bound, label in SUITABILITY:
+        if confidence >= bound:
+            return label
+    return "Low Suitability"
+
+def predict_crops_batch(inputs, top_k=5, model=None):
+    """Make crop predictions for many rows at once.
+
+    ``inputs`` is an (n, 7) matrix or a list of input dicts. Returns one
+    result dict per row, in the same format as ``predict_crop``.
+    """
+    matrix = to_matrix(inputs)
+    if len(matrix) == 0:
+        return []
+    model = model if model is not None else get_model()
+    
+    # Without a model every row goes through the rule-based fallback
+    if model is None:
+        return [get_rule_based_recommendations(*row) for row in matrix.tolist()]
+    
+    predicted, top, confidences = score_matrix(model, matrix, top_k)
+    names = model.classes_[top].astype(str).tolist()
+    labels = suitability_labels(confidences).tolist()
+    confidences = confidences.tolist()
+    
+    return [
+        {
+            "success": True,
+            "predictedCrop": str(prediction),
+            "recommendations": [
+                {"name": name, "confidence": confidence, "suitability": label}
+                for name, confidence, label in zip(row_names, row_confidences, row_labels)
+            ],
+            "source": "model"
+        }
+        for prediction, row_names, row_confidences, row_labels
+        in zip(predicted, names, confidences, labels)
+    ]
+
+def get_explainer(model=None):
+    """Return the explainer for the loaded model, precomputing its per-leaf tables on first use."""
+    global _explainer, _explainer_model
+    model = model if model is not None else get_model()
+    if _explainer_model is not model:
+        from forest_explainer import ForestExplainer
+        with _model_lock:
+            if _explainer_model is not model:
+                started = time.perf_counter()
+                # The explainer walks the trees, which work on scaled inputs
+                _explainer = ForestExplainer.from_model(model.model)
+                _explainer_model = model
+                print(f"Explainer built in {time.perf_counter() - started:.3f}s "
+                      f"({_explainer.nbytes / 1e6:.1f} MB)", file=sys.stderr)
+    return _explainer
+
+def explain_crops_batch(inputs, top_k=5, model=None):
+    """Make crop predictions for many rows, each with the reasons behind it.
+
+    Results have the format of ``predict_crops_batch``; every recommendation
+    also carries ``baseline``, the crop's confidence before looking at any
+    input, and ``contributions``, how much each input moved it from there
+    (in percentage points). Baseline plus contributions equals the crop's
+    probability; the rounded figures may differ from the rounded confidence
+    by a few hundredths. Rule-based results carry no explanation.
+    """
+    matrix = to_matrix(inputs)
+    if len(matrix) == 0:
+        return []
+    model = model if model is not None else get_model()
+    if model is None:
+        return [get_rule_based_recommendations(*row) for row in matrix.tolist()]
+    
+    explainer = get_explainer(model)
+    probabilities, contributions = explainer.explain(model.transform(matrix))
+    top, confidences = rank_probabilities(probabilities, top_k)
+    predicted = model.classes_[np.argmax(probabilities, axis=1)]
+    names = model.classes_[top].astype(str).tolist()
+    labels = suitability_labels(confidences).tolist()
+    baselines = np.round(explainer.bias[top] * 100, 2).tolist()
+    # (rows, features, classes) -> (rows, top-k, features), in percentage points
+    contributions = np.round(np.take_along_axis(contributions, top[:, None, :], axis=2) * 100, 2)
+    contributions = contributions.transpose(0, 2, 1).tolist()
+    confidences = confidences.tolist()
+    
+    return [
+        {
+            "success": True,
+            "predictedCrop": str(prediction),
+            "recommendations": [
+                {
+                    "name": name,
+                    "confidence": confidence,
+                    "suitability": label,
+                    "baseline": baseline,
+                    "contributions": dict(zip(FEATURES, crop_contributions))
+                }
+                for name, confidence, label, baseline, crop_contributions
+                in zip(row_names, row_confidences, row_labels, row_baselines, row_contributions)
+            ],
+            "source": "model"
+        }
+        for prediction, row_names, row_confidences, row_labels, row_baselines, row_contributions
+        in zip(predicted, names, confidences, labels, baselines, contributions)
+    ]
+
 def get_rule_based_recommendations(N, P, K, temperature, humidity, ph, rainfall):
     """Provide fallback recommendations when the model can't be loaded."""
     print("Using rule-based fallback recommendations", file=sys.stderr)
@@ -155,32 +637,305 @@ def get_rule_based_recommendations(N, P, K, temperature, humidity, ph, rainfall)
         "source": "rule-based"
     }
 
-# Main entry point when script is run
-if __name__ == "__main__":
+def serve(input_stream=None, output_stream=None, threads=4, explain=False):
+    """Answer newline-delimited JSON requests until the input stream closes.
+
+    Each request line is a JSON object with an ``id`` and the seven input
+    fields, ``{"id": ..., "op": "stats"}`` for the cache and grid counters or
+    ``{"id": ..., "op": "metrics"}`` for the worker metrics in the Prometheus
+    text format. A prediction request may set ``"explain": true`` to get the
+    reasons behind it (``explain`` sets the default). Requests run on a small
+    thread pool, so replies may come back out of order; every reply echoes
+    the request ``id`` for matching. A line that is not a JSON object is
+    answered with ``"id": null`` and its 1-based ``line`` number instead.
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    write_lock = threading.Lock()
+
+    def reply(payload):
+        line = json.dumps(payload)
+        with write_lock:
+            output_stream.write(line + "\n")
+            output_stream.flush()
+
+    def handle(request_id, input_data):
+        try:
+            if input_data.get("op") == "stats":
+                cache = get_cache()
+                grid = get_grid()
+                result = {
+                    "success": True,
+                    "cache": cache.stats() if cache else None,
+                    "grid": grid.stats() if grid else None
+                }
+            elif input_data.get("op") == "metrics":
+                result = {"success": True, "metrics": REGISTRY.render()}
+            else:
+                started = time.perf_counter()
+                result = predict_crop(*parse_input(input_data), explain=bool(input_data.get("explain", explain)))
+                cached = "true" if result.get("cached") else "false"
+                PREDICTION_SECONDS.labels(cached).observe(time.perf_counter() - started)
+                source = "lookup" if result.get("lookup") else result.get("source", "model")
+                PREDICTIONS.labels(source, cached).inc()
+        except Exception as e:
+            REQUEST_ERRORS.inc()
+            print(f"Request {request_id} failed: {str(e)}", file=sys.stderr)
+            result = {"success": False, "error": str(e)}
+        reply({"id": request_id, **result})
+
+    # Pay the model and grid loading cost once, before the first request arrives
+    get_model()
+    get_grid()
+    if explain and get_model() is not None:
+        get_explainer()
+    reply({"id": None, "event": "ready", "pid": os.getpid()})
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for line_number, line in enumerate(input_stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                request = None
+                error = f"Invalid JSON request: {str(e)}"
+            else:
+                error = None if isinstance(request, dict) else "Request must be a JSON object"
+            if error is not None:
+                # No id to echo; the line number lets the caller match the reply to what it sent
+                REQUEST_ERRORS.inc()
+                reply({"id": None, "line": line_number, "success": False, "error": error})
+                continue
+            executor.submit(handle, request.get("id"), request)
+
+def _feature_columns(header, path):
+    """Find the position of each model input in a file header (case-insensitive)."""
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+    missing = [name for name in FEATURES if name.lower() not in positions]
+    if missing:
+        raise ValueError(f"{path} is missing input columns: {', '.join(missing)}")
+    return [positions[name.lower()] for name in FEATURES]
+
+def _to_float(value):
+    """Parse one CSV cell, treating blanks and junk as 0 like the JSON inputs."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def iter_input_chunks(path, chunk_size):
+    """Yield (n, 7) float matrices of at most ``chunk_size`` rows from a CSV or Parquet file."""
+    path = str(path)
+    
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet input requires pyarrow (pip install pyarrow)")
+        
+        parquet_file = pq.ParquetFile(path)
+        names = parquet_file.schema_arrow.names
+        columns = [names[i] for i in _feature_columns(names, path)]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            matrix = np.column_stack([
+                batch.column(i).to_numpy(zero_copy_only=False).astype(float)
+                for i in range(len(columns))
+            ])
+            yield np.nan_to_num(matrix, nan=0.0)
+        return
+    
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        positions = _feature_columns(next(reader), path)
+        rows = []
+        for record in reader:
+            if not record:
+                continue
+            rows.append([_to_float(record[i]) if i < len(record) else 0.0 for i in positions])
+            if len(rows) == chunk_size:
+                yield np.array(rows, dtype=float)
+                rows = []
+        if rows:
+            yield np.array(rows, dtype=float)
+
+def _init_scoring_worker():
+    """Load the model once per pool worker."""
+    get_model()
+
+def score_chunk(matrix, top_k=5):
+    """Score one chunk and return output rows: prediction, top-k (crop, confidence) pairs, source."""
+    model = get_model()
+    
+    if model is None:
+        rows = []
+        for result in predict_crops_batch(matrix, top_k):
+            row = [result["predictedCrop"]]
+            recommendations = result["recommendations"][:top_k]
+            for crop in recommendations:
+                row.extend([crop["name"], crop["confidence"]])
+            row.extend(["", ""] * (top_k - len(recommendations)))
+            row.append(result["source"])
+            rows.append(row)
+        return rows
+    
+    predicted, top, confidences = score_matrix(model, matrix, top_k)
+    names = model.classes_[top].astype(str)
+    # Interleave crop names and confidences column-wise: name_1, confidence_1, ...
+    pairs = np.empty((len(matrix), 2 * top.shape[1]), dtype=object)
+    pairs[:, 0::2] = names
+    pairs[:, 1::2] = confidences
+    return [
+        [str(prediction)] + row + ["model"]
+        for prediction, row in zip(predicted, pairs.tolist())
+    ]
+
+def score_file(input_path, output_path, chunk_size=50000, workers=1, top_k=5):
+    """Score a soil survey file chunk by chunk, appending results to a CSV as they complete.
+
+    With ``workers`` > 1 chunks are spread over a process pool whose workers
+    each load the model once. Only a few chunks are in flight at a time, so
+    memory stays flat regardless of the input size.
+    """
+    started = time.perf_counter()
+    total_rows = 0
+    total_chunks = 0
+    
+    header = ["row", "predictedCrop"]
+    for rank in range(1, top_k + 1):
+        header.extend([f"crop_{rank}", f"confidence_{rank}"])
+    header.append("source")
+    
+    with open(output_path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(header)
+        
+        def write(rows):
+            nonlocal total_rows, total_chunks
+            writer.writerows([total_rows + i] + row for i, row in enumerate(rows))
+            total_rows += len(rows)
+            total_chunks += 1
+            out.flush()
+            print(f"Scored {total_rows} rows", file=sys.stderr)
+        
+        chunks = iter_input_chunks(input_path, chunk_size)
+        if workers <= 1:
+            for matrix in chunks:
+                write(score_chunk(matrix, top_k))
+        else:
+            # Keep a bounded window of chunks in flight and write them back in order
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker) as executor:
+                in_flight = deque()
+                for matrix in chunks:
+                    in_flight.append(executor.submit(score_chunk, matrix, top_k))
+                    if len(in_flight) >= 2 * workers:
+                        write(in_flight.popleft().result())
+                while in_flight:
+                    write(in_flight.popleft().result())
+    
+    elapsed = time.perf_counter() - started
+    return {
+        "success": True,
+        "input": str(input_path),
+        "output": str(output_path),
+        "rows": total_rows,
+        "chunks": total_chunks,
+        "seconds": round(elapsed, 3),
+        "rowsPerSecond": round(total_rows / elapsed, 1) if elapsed > 0 else None
+    }
+
+def main(argv=None):
+    """Command line entry point used by the Node.js backend."""
+    parser = argparse.ArgumentParser(description="AgroBoost crop recommender")
+    parser.add_argument("input", nargs="?",
+                        help="JSON object with the seven input fields, or a JSON array of them")
+    parser.add_argument("--engine", choices=["sklearn", "compact", "vectorized"],
+                        help="inference engine (overrides CROP_MODEL_ENGINE)")
+    parser.add_argument("--serve", action="store_true",
+                        help="keep the model loaded and answer newline-delimited JSON on stdin/stdout")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("CROP_SERVER_THREADS", 4)),
+                        help="number of requests answered concurrently in --serve mode")
+    parser.add_argument("--batch-size", type=int, default=1024,
+                        help="rows scored per model call when the input is a JSON array")
+    parser.add_argument("--score", metavar="INPUT",
+                        help="bulk-score a CSV or Parquet soil survey file")
+    parser.add_argument("--output", help="CSV file the --score results are written to")
+    parser.add_argument("--chunk-size", type=int, default=50000,
+                        help="rows read and scored at a time in --score mode")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to score chunks in --score mode")
+    parser.add_argument("--top-k", type=int, default=5,
+                        help="recommendations written per row in --score mode")
+    parser.add_argument("--explain", action="store_true",
+                        help="add per-input contributions to every recommendation "
+                             "(the default for requests in --serve mode)")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="profile this run: PATH ending in .speedscope.json samples every thread, "
+                             "any other PATH gets cProfile stats of the main thread (.prof)")
+    args = parser.parse_args(argv)
+    
+    if not args.profile:
+        return run(args, parser)
+    
+    try:
+        from profiler import Profile, kind_for_path
+    except ImportError:
+        print("Profiling unavailable (AI/utilities/profiler.py not found); running unprofiled", file=sys.stderr)
+        return run(args, parser)
+    profile = Profile(kind_for_path(args.profile)).start()
+    try:
+        return run(args, parser)
+    finally:
+        profile.stop()
+        profile.save(args.profile, name="crop_recommender " + " ".join(sys.argv[1:] if argv is None else argv))
+        print(f"Profile written to {args.profile}", file=sys.stderr)
+
+def run(args, parser):
+    """Carry out the command line request parsed by ``main``."""
+    if args.engine:
+        # Set before the model is loaded; --workers processes inherit it too
+        os.environ['CROP_MODEL_ENGINE'] = args.engine
+
+    if args.serve:
+        serve(threads=args.threads, explain=args.explain)
+        return 0
+    
+    if args.score:
+        if not args.output:
+            parser.error("--score requires --output")
+        try:
+            summary = score_file(args.score, args.output, args.chunk_size, args.workers, args.top_k)
+        except Exception as e:
+            print(f"Bulk scoring error: {str(e)}", file=sys.stderr)
+            print(json.dumps({"success": False, "error": str(e)}))
+            return 1
+        print(json.dumps(summary))
+        return 0
+
     try:
         # Get input data from arguments
-        if len(sys.argv) < 2:
+        if args.input is None:
             error_result = {
                 "success": False,
                 "error": "Missing input data argument"
             }
             print(json.dumps(error_result))
-            sys.exit(1)
+            return 1
             
-        input_json = sys.argv[1]
-        input_data = json.loads(input_json)
+        input_data = json.loads(args.input)
         
-        # Extract parameters with defaults
-        N = float(input_data.get('N', 0))
-        P = float(input_data.get('P', 0))
-        K = float(input_data.get('K', 0))
-        temperature = float(input_data.get('temperature', 0))
-        humidity = float(input_data.get('humidity', 0))
-        ph = float(input_data.get('ph', 0))
-        rainfall = float(input_data.get('rainfall', 0))
+        # A JSON array is scored in batches, streaming one result per line
+        if isinstance(input_data, list):
+            predict_batch = explain_crops_batch if args.explain else predict_crops_batch
+            for start in range(0, len(input_data), args.batch_size):
+                for result in predict_batch(input_data[start:start + args.batch_size]):
+                    print(json.dumps(result))
+                sys.stdout.flush()
+            return 0
         
         # Get result from either prediction or fallback
-        result = predict_crop(N, P, K, temperature, humidity, ph, rainfall)
+        result = predict_crop(*parse_input(input_data), explain=args.explain)
         
         # Print ONLY the JSON result to stdout for Node.js to capture
         print(json.dumps(result))
@@ -193,4 +948,9 @@ if __name__ == "__main__":
         # Log the actual error to stderr
         print(f"Python execution error: {str(e)}", file=sys.stderr)
         # Send only valid JSON to stdout
-        print(json.dumps(error_result))
\ No newline at end of file
+        print(json.dumps(error_result))
+    return 0
+
+# Main entry point when script is run
+if __name__ == "__main__":
+    sys.exit(main())
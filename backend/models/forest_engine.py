@@ -0,0 +1,207 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import os
+
+from compact_model import (
+    DEFAULT_EXPORT_DIR,
+    DEFAULT_MODEL_PATH,
+    CompactForest,
+    flatten_forest,
+    load_compact_model,
+    load_sklearn_model,
+    sample_inputs,
+)
+
+# Rows evaluated together; bounds the (trees, rows, classes) gather buffer
+BLOCK_ROWS = 2048
+
+class ForestEngine:
+    """Level-synchronous inference over every tree of a forest at once.
+
+    Each row keeps one cursor per tree and all cursors advance one level per
+    step with a handful of vectorized gathers over the flattened node arrays.
+    Leaves point back to themselves (threshold +inf), so cursors that reach a
+    leaf early simply stay put and no per-tree masking is needed.
+
+    Cursors are stored as ``2 * node`` so the next cursor is a single gather:
+    ``children[cursor + went_right]``.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes):
+        n_nodes = len(feature)
+        is_leaf = left < 0
+        nodes = np.arange(n_nodes)
+
+        # Leaves loop back to themselves whichever way the comparison goes
+        feature = np.where(is_leaf, 0, feature)
+        threshold = np.where(is_leaf, np.inf, threshold)
+        left = np.where(is_leaf, nodes, left)
+        right = np.where(is_leaf, nodes, right)
+
+        self.feature = np.repeat(feature, 2).astype(np.intp)
+        self.threshold = np.repeat(threshold, 2).astype(np.float64)
+        self.children = (2 * np.column_stack([left, right])).ravel().astype(np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = (2 * np.asarray(roots)).astype(np.intp)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = None
+        self.n_trees = len(roots)
+        self.max_depth = self._depth(left, right, np.asarray(roots), is_leaf)
+
+    @staticmethod
+    def _depth(left, right, roots, is_leaf):
+        """Number of levels needed for every cursor to reach a leaf."""
+        depth = 0
+        frontier = roots
+        while not is_leaf[frontier].all():
+            frontier = frontier[~is_leaf[frontier]]
+            frontier = np.concatenate([left[frontier], right[frontier]])
+            depth += 1
+        return depth
+
+    @classmethod
+    def from_compact(cls, forest):
+        """Build the engine from a CompactForest (memory-mapped export)."""
+        engine = cls(forest.feature, forest.threshold, forest.left, forest.right,
+                     forest.value, forest.roots, forest.classes_)
+        engine.n_features_in_ = forest.n_features_in_
+        return engine
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Build the engine directly from a fitted sklearn forest."""
+        arrays, meta = flatten_forest(model)
+        engine = cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+                     arrays['value'], arrays['roots'], model.classes_)
+        engine.n_features_in_ = meta['n_features']
+        return engine
+
+    def nodes(self):
+        """Return (feature, threshold, left, right) in the CompactForest layout, with leaves at -1."""
+        nodes = np.arange(len(self.value))
+        left = self.children[0::2] >> 1
+        right = self.children[1::2] >> 1
+        is_leaf = left == nodes
+        return (np.where(is_leaf, -1, self.feature[0::2]), np.where(is_leaf, 0.0, self.threshold[0::2]),
+                np.where(is_leaf, -1, left), np.where(is_leaf, -1, right))
+
+    def _check_input(self, X):
+        # Trees compare float32 inputs, exactly like sklearn
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected an (n, {self.n_features_in_}) input matrix, got shape {X.shape}")
+        return X
+
+    def _apply_block(self, X):
+        """Leaf node index for every (tree, row) pair of one block, shape (n_trees, n)."""
+        n = len(X)
+        if n == 1:
+            # Single rows keep 1-D cursors: six small gathers per level
+            x = X[0]
+            cursor = self.roots
+            for _ in range(self.max_depth):
+                went_right = x.take(self.feature.take(cursor)) > self.threshold.take(cursor)
+                cursor = self.children.take(cursor + went_right)
+            return (cursor >> 1)[:, None]
+
+        flat = X.ravel()
+        row_offset = np.arange(n) * X.shape[1]
+        cursor = np.repeat(self.roots[:, None], n, axis=1)
+        for level in range(self.max_depth):
+            values = flat.take(self.feature.take(cursor) + row_offset)
+            went_right = values > self.threshold.take(cursor)
+            advanced = self.children.take(cursor + went_right)
+            # Stop early once a step moves no cursor, i.e. every one sits on a leaf
+            if level % 4 == 3 and np.array_equal(advanced, cursor):
+                break
+            cursor = advanced
+        return cursor >> 1
+
+    def apply(self, X):
+        """Return the leaf reached in every tree, as an (n, n_trees) array of node indices."""
+        X = self._check_input(X)
+        blocks = [self._apply_block(X[i:i + BLOCK_ROWS]) for i in range(0, len(X), BLOCK_ROWS)]
+        if not blocks:
+            return np.empty((0, self.n_trees), dtype=np.intp)
+        return np.concatenate(blocks, axis=1).T
+
+    def predict_proba(self, X):
+        """Return class probabilities identical to sklearn's predict_proba."""
+        X = self._check_input(X)
+        proba = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for i in range(0, len(X), BLOCK_ROWS):
+            leaves = self._apply_block(X[i:i + BLOCK_ROWS])
+            # Trees are added in order, which keeps the floating point sum
+            # identical to sklearn's
+            if leaves.shape[1] == 1:
+                proba[i] = self.value.take(leaves[:, 0], axis=0).sum(axis=0)
+            else:
+                block = proba[i:i + BLOCK_ROWS]
+                block[:] = 0.0
+                for tree_leaves in leaves:
+                    block += self.value.take(tree_leaves, axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        """Return the most probable class for every row."""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def load_engine(model_dir=DEFAULT_EXPORT_DIR, model_path=DEFAULT_MODEL_PATH):
+    """Build the engine from the compact export, or from the pickled model if there is no export."""
+    if os.path.exists(os.path.join(model_dir, 'meta.json')):
+        return ForestEngine.from_compact(load_compact_model(model_dir))
+    return ForestEngine.from_sklearn(load_sklearn_model(model_path))
+
+def _latency(fn, X, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the vectorized forest engine against sklearn")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled sklearn model")
+    parser.add_argument('--rows', type=int, default=10000, help="random rows to compare")
+    parser.add_argument('--repeat', type=int, default=200, help="timing repetitions for single rows")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    model = load_sklearn_model(args.model)
+    forest = CompactForest(*flatten_forest(model))
+    engine = ForestEngine.from_compact(forest)
+    X = sample_inputs(forest, args.rows, args.seed)
+
+    expected = model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    row = X[:1]
+    report = {
+        'rows': args.rows,
+        'identical': bool(np.array_equal(expected, actual)),
+        'maxAbsDiff': float(np.max(np.abs(expected - actual))),
+        'levels': engine.max_depth,
+        'singleRowMicroseconds': {
+            'sklearn': round(_latency(model.predict_proba, row, args.repeat) * 1e6, 1),
+            'vectorized': round(_latency(engine.predict_proba, row, args.repeat) * 1e6, 1),
+        },
+        'batchRowsPerSecond': {},
+    }
+    for size in (100, 1000, args.rows):
+        batch = X[:size]
+        report['batchRowsPerSecond'][str(size)] = {
+            'sklearn': round(size / _latency(model.predict_proba, batch, 3)),
+            'vectorized': round(size / _latency(engine.predict_proba, batch, 3)),
+        }
+    report['success'] = report['identical']
+    print(json.dumps(report))
+    return 0 if report['identical'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from compact_model import DEFAULT_MODEL_PATH, CompactForest, flatten_forest, load_sklearn_model, sample_inputs
+from forest_engine import ForestEngine
+
+# Rows explained together; bounds the (rows, trees, features, classes) gather buffer
+BLOCK_ROWS = 64
+
+class ForestExplainer:
+    """Per-feature contributions to the class probabilities of a tree ensemble.
+
+    Path decomposition (Saabas): on the way from the root to a leaf, every
+    split moves the node's class distribution from the parent's value to
+    the child's, and that change is credited to the feature the parent
+    splits on. The root value plus the changes along the path add up to the
+    leaf value, so averaged over the trees
+
+        bias + contributions.sum(axis=features) == predict_proba
+
+    holds for every row. The path sums are precomputed for every leaf when
+    the explainer is built, so explaining a row costs one leaf lookup per
+    tree and one gather of the leaves' (features, classes) matrices.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, n_features, engine=None):
+        feature = np.asarray(feature)
+        left = np.asarray(left)
+        right = np.asarray(right)
+        value = np.asarray(value, dtype=np.float64)
+        roots = np.asarray(roots)
+
+        if engine is None:
+            engine = ForestEngine(feature, threshold, left, right, value, roots, classes)
+            engine.n_features_in_ = n_features
+        self.engine = engine
+        self.classes_ = np.asarray(classes)
+        self.n_features = n_features
+        self.n_trees = len(roots)
+        # Expected probabilities before any split: the mean root distribution
+        self.bias = value[roots].mean(axis=0)
+
+        leaves = np.flatnonzero(left < 0)
+        self.leaf_row = np.full(len(value), -1, dtype=np.intp)
+        self.leaf_row[leaves] = np.arange(len(leaves))
+        self.leaf_value = value[leaves]
+        self.leaf_contributions = self._path_contributions(feature, left, right, value, roots)[leaves]
+
+    def _path_contributions(self, feature, left, right, value, roots):
+        """Sum of the value changes per split feature from the root to every node, (nodes, features, classes)."""
+        contributions = np.zeros((len(value), self.n_features, value.shape[1]))
+        frontier = roots
+        # All trees advance one level per step
+        while frontier.size:
+            internal = frontier[left[frontier] >= 0]
+            split_on = feature[internal]
+            for children in (left[internal], right[internal]):
+                contributions[children] = contributions[internal]
+                contributions[children, split_on] += value[children] - value[internal]
+            frontier = np.concatenate([left[internal], right[internal]])
+        return contributions
+
+    @classmethod
+    def from_model(cls, model):
+        """Build the explainer for a fitted sklearn forest, a CompactForest or a ForestEngine."""
+        if isinstance(model, ForestEngine):
+            feature, threshold, left, right = model.nodes()
+            roots = model.roots >> 1
+            return cls(feature, threshold, left, right, model.value, roots, model.classes_,
+                       model.n_features_in_, engine=model)
+        if isinstance(model, CompactForest):
+            return cls(model.feature, model.threshold, model.left, model.right, model.value, model.roots,
+                       model.classes_, model.n_features_in_)
+        arrays, meta = flatten_forest(model)
+        return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'],
+                   arrays['roots'], model.classes_, meta['n_features'])
+
+    @property
+    def nbytes(self):
+        return self.leaf_contributions.nbytes + self.leaf_value.nbytes + self.leaf_row.nbytes
+
+    def explain(self, X):
+        """Return (probabilities, contributions) for every row of X.
+
+        Probabilities are (n, classes) and identical to the model's
+        predict_proba; contributions are (n, features, classes).
+        """
+        rows = self.leaf_row[self.engine.apply(X)]
+        n = len(rows)
+        probabilities = np.empty((n, len(self.classes_)))
+        contributions = np.empty((n, self.n_features, len(self.classes_)))
+        for start in range(0, n, BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            # Summed over the tree axis in tree order, like sklearn's predict_proba
+            probabilities[start:start + BLOCK_ROWS] = self.leaf_value[block].sum(axis=1)
+            contributions[start:start + BLOCK_ROWS] = self.leaf_contributions[block].sum(axis=1)
+        probabilities /= self.n_trees
+        contributions /= self.n_trees
+        return probabilities, contributions
+
+def _latency(fn, X, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the forest explainer against sklearn and time it")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled sklearn model")
+    parser.add_argument('--rows', type=int, default=10000, help="random rows to check")
+    parser.add_argument('--repeat', type=int, default=200, help="timing repetitions for single rows")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    model = load_sklearn_model(args.model)
+    started = time.perf_counter()
+    explainer = ForestExplainer.from_model(model)
+    build_seconds = time.perf_counter() - started
+    X = sample_inputs(CompactForest(*flatten_forest(model)), args.rows, args.seed)
+
+    expected = model.predict_proba(X)
+    probabilities, contributions = explainer.explain(X)
+    reconstructed = explainer.bias + contributions.sum(axis=1)
+    report = {
+        'rows': args.rows,
+        'identical': bool(np.array_equal(expected, probabilities)),
+        'maxAdditivityError': float(np.max(np.abs(reconstructed - expected))),
+        'buildSeconds': round(build_seconds, 4),
+        'tableBytes': explainer.nbytes,
+        'singleRowMicroseconds': {
+            'predict_proba': round(_latency(explainer.engine.predict_proba, X[:1], args.repeat) * 1e6, 1),
+            'explain': round(_latency(explainer.explain, X[:1], args.repeat) * 1e6, 1),
+        },
+        'batchRowsPerSecond': {},
+    }
+    for size in (100, 1000, args.rows):
+        batch = X[:size]
+        report['batchRowsPerSecond'][str(size)] = {
+            'predict_proba': round(size / _latency(explainer.engine.predict_proba, batch, 3)),
+            'explain': round(size / _latency(explainer.explain, batch, 3)),
+        }
+    report['success'] = report['identical'] and report['maxAdditivityError'] < 1e-9
+    print(json.dumps(report))
+    return 0 if report['success'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
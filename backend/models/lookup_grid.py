@@ -0,0 +1,389 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import numpy as np
+import os
+from pathlib import Path
+
+# Get the directory of the current script
+script_dir = Path(__file__).parent.absolute()
+
+DEFAULT_GRID_DIR = os.path.join(script_dir, 'crop_lookup_grid')
+MODEL_PATH = os.path.join(script_dir, 'crop_recommendation_model.pkl')
+
+# Table files written by build_grid: top-k class indices and their
+# confidences in hundredths of a percent, one row per grid cell
+CLASSES_FILE = 'classes.npy'
+CONFIDENCES_FILE = 'confidences.npy'
+META_FILE = 'meta.json'
+FORMAT_VERSION = 2
+
+# Default grid: the points sampled along each input and the physically valid
+# range its axis is clipped to. The axis itself spans the training data, the
+# scaler's mean plus or minus DEFAULT_SPREAD standard deviations
+DEFAULT_AXES = (
+    ('N', 8, 0.0, None),
+    ('P', 8, 0.0, None),
+    ('K', 8, 0.0, None),
+    ('temperature', 8, None, None),
+    ('humidity', 8, 0.0, 100.0),
+    ('ph', 6, 0.0, 14.0),
+    ('rainfall', 8, 0.0, None),
+)
+DEFAULT_SPREAD = 3.0
+
+# A grid is degenerate, and refused, when fewer distinct crops than this top
+# its cells or one crop tops more than this share of them
+DEFAULT_MIN_CLASSES = 5
+DEFAULT_MAX_CLASS_SHARE = 0.5
+
+# Cells whose best two crops are closer than this (in percentage points) are
+# answered by the live model instead
+DEFAULT_MIN_MARGIN = 10.0
+
+class LookupGrid:
+    """Precomputed top-k recommendations over a quantized grid of the seven inputs.
+
+    Axis ``i`` samples ``points`` values evenly from ``low`` to ``high``; an
+    input is answered from the nearest grid point, so it is off by at most
+    half a step per input. Inputs outside any axis range and cells where the
+    model's top two crops are within ``min_margin`` percentage points are
+    not answered (``lookup`` returns None) and must go to the live model.
+    The tables are memory-mapped, so worker processes share one copy.
+    """
+
+    def __init__(self, classes, confidences, meta, min_margin=None):
+        self.classes = classes
+        self.confidences = confidences
+        self.meta = meta
+        self.class_names = [str(name) for name in meta['classes']]
+        self.top_k = classes.shape[1]
+        self.min_margin = float(meta['min_margin'] if min_margin is None else min_margin)
+        self._min_margin_hundredths = int(round(self.min_margin * 100))
+
+        axes = meta['axes']
+        self.lows = [float(axis['low']) for axis in axes]
+        self.highs = [float(axis['high']) for axis in axes]
+        self.points = [int(axis['points']) for axis in axes]
+        self.scales = [(points - 1) / (high - low) if points > 1 else 0.0
+                       for low, high, points in zip(self.lows, self.highs, self.points)]
+        # Row-major strides of the flattened grid
+        self.strides = [int(np.prod(self.points[i + 1:])) for i in range(len(self.points))]
+
+        self.hits = 0
+        self.out_of_range = 0
+        self.low_margin = 0
+        self._lock = threading.Lock()
+
+    def cell(self, values):
+        """Return the flat index of the grid point nearest to ``values``, or None if out of range."""
+        index = 0
+        for value, low, high, scale, stride in zip(values, self.lows, self.highs, self.scales, self.strides):
+            # Written so NaN fails the range check too
+            if not low <= value <= high:
+                return None
+            index += int((value - low) * scale + 0.5) * stride
+        return index
+
+    def lookup(self, values):
+        """Return (class indices, confidences in percent) best first, or None to use the live model."""
+        index = self.cell(values)
+        if index is None:
+            with self._lock:
+                self.out_of_range += 1
+            return None
+
+        hundredths = self.confidences[index].tolist()
+        if self.top_k > 1 and hundredths[0] - hundredths[1] < self._min_margin_hundredths:
+            with self._lock:
+                self.low_margin += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return self.classes[index].tolist(), [value / 100 for value in hundredths]
+
+    def lookup_many(self, matrix):
+        """Vectorized ``lookup`` for an (n, 7) matrix, without touching the counters.
+
+        Returns a boolean mask of the rows answered from the grid, and the
+        top-k class indices and confidences (in percent) for every row; rows
+        outside the mask hold meaningless values.
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        lows, highs = np.array(self.lows), np.array(self.highs)
+        in_range = np.all((matrix >= lows) & (matrix <= highs), axis=1)
+        positions = np.floor((np.where(in_range[:, None], matrix, lows) - lows) * np.array(self.scales) + 0.5)
+        index = positions.astype(np.int64) @ np.array(self.strides, dtype=np.int64)
+
+        hundredths = np.asarray(self.confidences[index], dtype=np.int64)
+        served = in_range
+        if self.top_k > 1:
+            served = served & (hundredths[:, 0] - hundredths[:, 1] >= self._min_margin_hundredths)
+        return served, np.asarray(self.classes[index]), hundredths / 100
+
+    def stats(self):
+        """Return the lookup counters and the accuracy measured when the grid was built."""
+        with self._lock:
+            lookups = self.hits + self.out_of_range + self.low_margin
+            return {
+                "cells": len(self.classes),
+                "minMargin": self.min_margin,
+                "hits": self.hits,
+                "outOfRange": self.out_of_range,
+                "lowMargin": self.low_margin,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "validation": self.meta.get('validation')
+            }
+
+def file_fingerprint(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def model_fingerprint(model_path=MODEL_PATH):
+    """SHA-256 of the pickled model and its metadata, so a grid built from another model is never served."""
+    from model_meta import DEFAULT_META_PATH
+    meta_path = os.environ.get('CROP_MODEL_META', DEFAULT_META_PATH)
+    combined = file_fingerprint(model_path) + file_fingerprint(meta_path)
+    return hashlib.sha256(combined.encode('ascii')).hexdigest()
+
+def grid_axes(model, overrides=(), spread=DEFAULT_SPREAD):
+    """Return the axes as dicts, applying ``NAME=LOW:HIGH:POINTS`` overrides.
+
+    Default axes cover the inputs the model was trained on: ``spread``
+    standard deviations either side of the training mean, taken from the
+    scaler of ``model`` (a ScaledModel) and clipped to the valid range.
+    """
+    axes = {}
+    for (name, points, floor, ceiling), mean, scale in zip(DEFAULT_AXES, model.mean, model.scale):
+        low, high = float(mean - spread * scale), float(mean + spread * scale)
+        axes[name] = {
+            'name': name,
+            'low': round(low if floor is None else max(low, floor), 4),
+            'high': round(high if ceiling is None else min(high, ceiling), 4),
+            'points': points,
+        }
+    for override in overrides:
+        name, _, spec = override.partition('=')
+        if name not in axes:
+            raise ValueError(f"Unknown input {name!r}; expected one of {', '.join(axes)}")
+        try:
+            low, high, points = spec.split(':')
+            axis = {'name': name, 'low': float(low), 'high': float(high), 'points': int(points)}
+        except ValueError:
+            raise ValueError(f"Invalid axis {override!r}; expected NAME=LOW:HIGH:POINTS")
+        if axis['points'] < 1 or axis['high'] <= axis['low']:
+            raise ValueError(f"Invalid axis {override!r}; need HIGH > LOW and at least one point")
+        axes[name] = axis
+    return [axes[name] for name, _, _, _ in DEFAULT_AXES]
+
+def class_coverage(grid):
+    """How many distinct crops top the grid's cells, and the share of cells the most common one tops."""
+    counts = np.bincount(np.asarray(grid.classes[:, 0]), minlength=len(grid.class_names))
+    return int(np.count_nonzero(counts)), float(counts.max() / counts.sum())
+
+def grid_points(axes, start, stop):
+    """Return the inputs at flat grid indices ``start`` to ``stop`` as an (n, 7) matrix."""
+    shape = [axis['points'] for axis in axes]
+    positions = np.unravel_index(np.arange(start, stop), shape)
+    return np.column_stack([
+        np.linspace(axis['low'], axis['high'], axis['points'])[position]
+        for axis, position in zip(axes, positions)
+    ])
+
+def build_grid(model, axes, output_dir=DEFAULT_GRID_DIR, top_k=5, min_margin=DEFAULT_MIN_MARGIN,
+               chunk_size=65536):
+    """Score every grid point with ``model`` and write the tables; returns the metadata.
+
+    The tables are written through memory maps chunk by chunk, so building a
+    grid larger than memory is fine.
+    """
+    from crop_recommender import score_matrix
+
+    n_classes = len(model.classes_)
+    if n_classes > 256:
+        raise ValueError(f"{n_classes} classes do not fit the uint8 class table")
+    top_k = min(top_k, n_classes)
+    cells = int(np.prod([axis['points'] for axis in axes]))
+
+    os.makedirs(output_dir, exist_ok=True)
+    classes = np.lib.format.open_memmap(os.path.join(output_dir, CLASSES_FILE), mode='w+',
+                                        dtype=np.uint8, shape=(cells, top_k))
+    confidences = np.lib.format.open_memmap(os.path.join(output_dir, CONFIDENCES_FILE), mode='w+',
+                                            dtype=np.uint16, shape=(cells, top_k))
+    for start in range(0, cells, chunk_size):
+        stop = min(start + chunk_size, cells)
+        _, top, percents = score_matrix(model, grid_points(axes, start, stop), top_k)
+        classes[start:stop] = top
+        confidences[start:stop] = np.rint(percents * 100)
+        print(f"Scored {stop} of {cells} grid cells", file=sys.stderr)
+    classes.flush()
+    confidences.flush()
+    del classes, confidences
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'classes': np.asarray(model.classes_).tolist(),
+        'top_k': top_k,
+        'axes': axes,
+        'cells': cells,
+        'min_margin': min_margin,
+        'model_sha256': model_fingerprint(),
+    }
+    with open(os.path.join(output_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def load_grid(grid_dir=DEFAULT_GRID_DIR, min_margin=None, check_model=True, check_degenerate=True):
+    """Memory-map a built grid, refusing one built from a different model or found degenerate."""
+    with open(os.path.join(grid_dir, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported lookup grid format: {meta.get('format_version')}")
+    if check_model and meta.get('model_sha256') != model_fingerprint():
+        raise ValueError(f"Lookup grid in {grid_dir} was built from a different model; rebuild it")
+    if check_degenerate and (meta.get('validation') or {}).get('degenerate'):
+        raise ValueError(f"Lookup grid in {grid_dir} is degenerate: {meta['validation']['degenerate']}")
+
+    classes = np.load(os.path.join(grid_dir, CLASSES_FILE), mmap_mode='r').view(np.ndarray)
+    confidences = np.load(os.path.join(grid_dir, CONFIDENCES_FILE), mmap_mode='r').view(np.ndarray)
+    return LookupGrid(classes, confidences, meta, min_margin)
+
+def validate_grid(grid, model, rows=20000, seed=0, min_classes=DEFAULT_MIN_CLASSES,
+                  max_class_share=DEFAULT_MAX_CLASS_SHARE):
+    """Compare grid answers with the live model at random inputs inside the grid.
+
+    ``agreement`` is the share of rows where the grid and the model pick the
+    same top crop, counting rows that fall back to the model as agreeing.
+    ``maxConfidenceError`` is the largest difference, in percentage points,
+    between a confidence the grid returns and the model's confidence for
+    the same crop; it is measured over the rows the grid answers.
+
+    Agreement alone can't tell a useful grid from a copy of a constant
+    function (a model fed inputs in the wrong units), so ``degenerate``
+    names the problem when fewer than ``min_classes`` crops top any cell or
+    one crop tops more than ``max_class_share`` of them, and is None
+    otherwise.
+    """
+    from crop_recommender import score_matrix
+
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(low, high, size=rows) for low, high in zip(grid.lows, grid.highs)])
+    served, grid_top, grid_confidences = grid.lookup_many(X)
+
+    probabilities = model.predict_proba(X)
+    _, live_top, _ = score_matrix(model, X, grid.top_k)
+    live_confidences = np.rint(np.take_along_axis(probabilities, grid_top.astype(np.int64), axis=1) * 10000) / 100
+    errors = np.abs(grid_confidences - live_confidences).max(axis=1)[served]
+    agrees = grid_top[:, 0] == live_top[:, 0]
+
+    distinct, largest_share = class_coverage(grid)
+    degenerate = None
+    if distinct < min(min_classes, len(grid.class_names)):
+        degenerate = f"only {distinct} distinct top crops over {len(grid.classes)} cells"
+    elif largest_share > max_class_share:
+        degenerate = f"one crop tops {largest_share:.1%} of the cells"
+
+    return {
+        'rows': rows,
+        'served': int(served.sum()),
+        'fallbackRate': round(float(1 - served.mean()), 4),
+        'agreement': round(float(np.mean(agrees | ~served)), 4),
+        'servedAgreement': round(float(agrees[served].mean()), 4) if served.any() else None,
+        'maxConfidenceError': round(float(errors.max()), 2) if errors.size else 0.0,
+        'p99ConfidenceError': round(float(np.percentile(errors, 99)), 2) if errors.size else 0.0,
+        'distinctTopClasses': distinct,
+        'largestClassShare': round(largest_share, 4),
+        'degenerate': degenerate,
+    }
+
+def table_bytes(grid_dir):
+    return sum(os.path.getsize(os.path.join(grid_dir, name)) for name in (CLASSES_FILE, CONFIDENCES_FILE))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and validate the crop recommendation lookup grid")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="score the model over the grid and write the tables")
+    build_parser.add_argument('--output', default=DEFAULT_GRID_DIR, help="grid directory")
+    build_parser.add_argument('--axis', action='append', default=[], metavar='NAME=LOW:HIGH:POINTS',
+                              help="override the range and resolution of one input (repeatable)")
+    build_parser.add_argument('--min-margin', type=float, default=DEFAULT_MIN_MARGIN,
+                              help="fall back to the model when the top two crops are closer than this")
+    build_parser.add_argument('--chunk-size', type=int, default=65536, help="grid cells scored per model call")
+
+    validate_parser = subparsers.add_parser('validate', help="check a built grid against the model")
+    validate_parser.add_argument('--grid', default=DEFAULT_GRID_DIR, help="grid directory")
+    validate_parser.add_argument('--min-margin', type=float, help="override the margin stored in the grid")
+
+    for subparser in (build_parser, validate_parser):
+        subparser.add_argument('--engine', choices=['sklearn', 'compact', 'vectorized'],
+                               help="engine used to score (overrides CROP_MODEL_ENGINE)")
+        subparser.add_argument('--rows', type=int, default=20000, help="random inputs compared with the model")
+        subparser.add_argument('--seed', type=int, default=0)
+        subparser.add_argument('--max-error', type=float,
+                               help="fail when the measured confidence error exceeds this many points")
+        subparser.add_argument('--min-classes', type=int, default=DEFAULT_MIN_CLASSES,
+                               help="fail when fewer distinct crops top the grid's cells")
+        subparser.add_argument('--max-class-share', type=float, default=DEFAULT_MAX_CLASS_SHARE,
+                               help="fail when one crop tops more than this share of the cells")
+    build_parser.add_argument('--spread', type=float, default=DEFAULT_SPREAD,
+                              help="default axes span this many training standard deviations around the mean")
+    args = parser.parse_args(argv)
+
+    if args.engine:
+        os.environ['CROP_MODEL_ENGINE'] = args.engine
+    from crop_recommender import get_model
+    model = get_model()
+    if model is None:
+        print(json.dumps({'success': False, 'error': "Model could not be loaded"}))
+        return 1
+
+    started = time.perf_counter()
+    if args.command == 'build':
+        try:
+            axes = grid_axes(model, args.axis, args.spread)
+        except ValueError as e:
+            parser.error(str(e))
+        meta = build_grid(model, axes, args.output, min_margin=args.min_margin, chunk_size=args.chunk_size)
+        grid_dir = args.output
+    else:
+        grid_dir = args.grid
+    build_seconds = time.perf_counter() - started
+
+    # Checked below, so a degenerate grid is still loaded to report on it
+    grid = load_grid(grid_dir, args.min_margin if args.command == 'validate' else None, check_degenerate=False)
+    validation = validate_grid(grid, model, args.rows, args.seed, args.min_classes, args.max_class_share)
+    if args.command == 'build':
+        # Ship the measured accuracy with the grid; LookupGrid.stats reports it
+        meta['validation'] = validation
+        with open(os.path.join(grid_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    within_budget = args.max_error is None or validation['maxConfidenceError'] <= args.max_error
+    print(json.dumps({
+        'success': within_budget and validation['degenerate'] is None,
+        'grid': grid_dir,
+        'cells': len(grid.classes),
+        'bytes': table_bytes(grid_dir),
+        'seconds': round(build_seconds, 3),
+        'minMargin': grid.min_margin,
+        **validation,
+    }))
+    if not within_budget:
+        print(f"Lookup grid error {validation['maxConfidenceError']} exceeds {args.max_error} points", file=sys.stderr)
+        return 1
+    if validation['degenerate'] is not None:
+        print(f"Lookup grid is degenerate: {validation['degenerate']}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import sys
+import json
+import argparse
+import numpy as np
+import os
+from pathlib import Path
+
+# Get the directory of the current script
+script_dir = Path(__file__).parent.absolute()
+
+# Shipped next to the model: the input columns, the crop name of every class
+# and the StandardScaler the model was trained behind
+DEFAULT_META_PATH = os.path.join(script_dir, 'crop_recommendation_model.json')
+
+class ScaledModel:
+    """A trained classifier together with the preprocessing it was trained with.
+
+    The forest was fitted on standardized inputs with label-encoded crops, so
+    raw agronomic values must be scaled with the training mean and standard
+    deviation before scoring, and its integer classes mapped back to crop
+    names. ``predict_proba`` takes raw inputs; ``classes_`` holds the names.
+    ``model`` is the wrapped estimator (sklearn, CompactForest or
+    ForestEngine), which works in the scaled space.
+    """
+
+    def __init__(self, model, mean, scale, class_names):
+        self.model = model
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.classes_ = np.asarray(class_names, dtype=str)
+        self.n_features_in_ = model.n_features_in_
+        if self.mean.shape != (self.n_features_in_,) or self.scale.shape != (self.n_features_in_,):
+            raise ValueError(f"Scaler has {self.mean.size} features, the model {self.n_features_in_}")
+        if not np.all(self.scale > 0):
+            raise ValueError("Scaler standard deviations must be positive")
+        if len(self.classes_) != len(model.classes_):
+            raise ValueError(f"{len(self.classes_)} class names for {len(model.classes_)} model classes")
+
+    def transform(self, X):
+        """Standardize raw inputs into the space the model was trained in."""
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def load_meta(path=DEFAULT_META_PATH, features=None):
+    """Read and check the model metadata file.
+
+    ``classNames[i]`` names ``model.classes_[i]``; ``scaler`` holds the
+    per-feature ``mean`` and ``scale`` in the order of ``features``.
+    """
+    with open(path, encoding='utf-8') as f:
+        meta = json.load(f)
+    try:
+        class_names = [str(name) for name in meta['classNames']]
+        mean = [float(value) for value in meta['scaler']['mean']]
+        scale = [float(value) for value in meta['scaler']['scale']]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid model metadata in {path}: {str(e)}")
+    if features is not None and meta.get('features') != list(features):
+        raise ValueError(f"Model metadata features {meta.get('features')} do not match {list(features)}")
+    return {'features': meta.get('features'), 'classNames': class_names, 'scaler': {'mean': mean, 'scale': scale}}
+
+def wrap_model(model, meta):
+    """Attach the scaler and class names of ``meta`` to a loaded estimator."""
+    return ScaledModel(model, meta['scaler']['mean'], meta['scaler']['scale'], meta['classNames'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write the crop model metadata from the fitted training preprocessing")
+    parser.add_argument('--scaler', required=True, help="pickled StandardScaler fitted on the training inputs")
+    parser.add_argument('--label-encoder', required=True, help="pickled LabelEncoder fitted on the crop labels")
+    parser.add_argument('--features', default='N,P,K,temperature,humidity,ph,rainfall',
+                        help="input columns in training order")
+    parser.add_argument('--output', default=DEFAULT_META_PATH, help="metadata file to write")
+    args = parser.parse_args(argv)
+
+    import joblib
+    scaler = joblib.load(args.scaler)
+    encoder = joblib.load(args.label_encoder)
+    meta = {
+        'features': args.features.split(','),
+        'classNames': [str(name) for name in encoder.classes_],
+        'scaler': {'mean': np.asarray(scaler.mean_).tolist(), 'scale': np.asarray(scaler.scale_).tolist()},
+    }
+    if len(meta['scaler']['mean']) != len(meta['features']):
+        print(f"Scaler has {len(meta['scaler']['mean'])} features, expected {len(meta['features'])}", file=sys.stderr)
+        return 1
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    print(json.dumps({'success': True, 'output': args.output, 'classes': len(meta['classNames'])}))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
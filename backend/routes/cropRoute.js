@@ -18,6 +18,99 @@ const metrics = {
   lastReset: new Date().toISOString()
 };
 
+// Persistent Python worker: loads the model once and answers newline-delimited
+// JSON requests, so each recommendation no longer pays for interpreter startup
+const PYTHON_PATH = process.env.PYTHON_PATH || 'python'; // Use 'python3' for Linux/Mac
+const WORKER_TIMEOUT_MS = parseInt(process.env.CROP_WORKER_TIMEOUT_MS || '10000', 10);
+const pendingPredictions = new Map();
+let cropWorker = null;
+let nextPredictionId = 1;
+
+function startCropWorker() {
+  const shell = new PythonShell('crop_recommender.py', {
+    mode: 'json',
+    pythonPath: PYTHON_PATH,
+    scriptPath: path.join(__dirname, '../models'),
+    args: ['--serve']
+  });
+
+  console.log(`[${new Date().toISOString()}] STARTING PYTHON WORKER: pid=${shell.childProcess.pid}`);
+
+  // Lines written to this worker; replies to unreadable requests carry the line number instead of an id
+  shell.linesSent = 0;
+
+  shell.on('message', message => {
+    // Replies carry the id of the request they answer; anything else is a worker event
+    if (message.id === null || message.id === undefined) {
+      if (message.event) {
+        console.log(`[${new Date().toISOString()}] PYTHON WORKER EVENT: ${message.event}`);
+        return;
+      }
+      console.error(`[${new Date().toISOString()}] PYTHON WORKER REJECTED LINE ${message.line}: ${message.error}`);
+      for (const [id, pending] of pendingPredictions) {
+        if (pending.worker === shell && pending.line === message.line) {
+          pendingPredictions.delete(id);
+          clearTimeout(pending.timer);
+          pending.resolve(message);
+          break;
+        }
+      }
+      return;
+    }
+    const pending = pendingPredictions.get(message.id);
+    if (!pending) return;
+    pendingPredictions.delete(message.id);
+    clearTimeout(pending.timer);
+    pending.resolve(message);
+  });
+
+  shell.on('stderr', line => {
+    console.log(`[${new Date().toISOString()}] PYTHON WORKER: ${line}`);
+  });
+
+  shell.on('close', () => {
+    console.warn(`[${new Date().toISOString()}] PYTHON WORKER EXITED`);
+    if (cropWorker === shell) cropWorker = null;
+    // Fail whatever was in flight on this worker; the next request starts a fresh one
+    for (const [id, pending] of pendingPredictions) {
+      if (pending.worker !== shell) continue;
+      clearTimeout(pending.timer);
+      pending.reject(new Error('Python worker exited'));
+      pendingPredictions.delete(id);
+    }
+  });
+
+  shell.on('error', err => {
+    console.error(`[${new Date().toISOString()}] PYTHON WORKER ERROR: ${err.message}`);
+  });
+
+  return shell;
+}
+
+function runPrediction(params) {
+  if (!cropWorker) {
+    cropWorker = startCropWorker();
+  }
+
+  const id = nextPredictionId++;
+  const worker = cropWorker;
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      pendingPredictions.delete(id);
+      reject(new Error(`Python worker timed out after ${WORKER_TIMEOUT_MS}ms`));
+      // A worker that misses the deadline is presumed stuck; replace it rather than
+      // queueing every later request behind it. Its 'close' fails the rest of its requests
+      if (cropWorker === worker) cropWorker = null;
+      console.warn(`[${new Date().toISOString()}] KILLING UNRESPONSIVE PYTHON WORKER: pid=${worker.childProcess.pid}`);
+      worker.kill();
+    }, WORKER_TIMEOUT_MS);
+
+    const line = ++worker.linesSent;
+    pendingPredictions.set(id, { resolve, reject, timer, worker, line });
+    worker.send({ id, ...params });
+  });
+}
+
 // Middleware to track request metrics
 router.use((req, res, next) => {
   // Mark the start time
@@ -106,6 +199,19 @@ router.get('/health', (req, res) => {
   });
 });
 
+// Worker metrics (prediction counters, latency histograms, process gauges)
+// in the Prometheus text format, same as the AI service's /metrics. Served on
+// its own path; GET /metrics below stays the JSON route metrics
+router.get('/metrics/prometheus', async (req, res) => {
+  try {
+    const result = await runPrediction({ op: 'metrics' });
+    res.type('text/plain; version=0.0.4; charset=utf-8').send(result.metrics);
+  } catch (err) {
+    console.error(`[${new Date().toISOString()}] METRICS ERROR: ${err.message}`);
+    res.status(503).type('text/plain').send(`# crop worker unavailable: ${err.message}\n`);
+  }
+});
+
 // Get a list of all supported crops
 router.get('/supported-crops', (req, res) => {
   // This could be dynamically loaded from your model in the future
@@ -143,21 +249,13 @@ router.post('/recommend', async (req, res) => {
         });
       }
       
-      // Set up options for PythonShell
-      const options = {
-        mode: 'json',
-        pythonPath: 'python', // Use 'python3' for Linux/Mac
-        scriptPath: path.join(__dirname, '../models'),
-        args: [JSON.stringify({ N, P, K, temperature, humidity, ph, rainfall })]
-      };
-      
-      console.log(`[${new Date().toISOString()}] INVOKING PYTHON: ${path.join(__dirname, '../models', 'crop_recommender.py')}`);
+      console.log(`[${new Date().toISOString()}] INVOKING PYTHON WORKER: ${path.join(__dirname, '../models', 'crop_recommender.py')}`);
       
       const modelStartTime = performance.now();
       
-      // Call Python script
-      PythonShell.run('crop_recommender.py', options)
-        .then(results => {
+      // Send the request to the long-lived Python worker
+      runPrediction({ N, P, K, temperature, humidity, ph, rainfall })
+        .then(result => {
           const modelEndTime = performance.now();
           const modelDuration = modelEndTime - modelStartTime;
           
@@ -169,11 +267,10 @@ router.post('/recommend', async (req, res) => {
           
           console.log(`[${new Date().toISOString()}] MODEL RESPONSE TIME: ${modelDuration.toFixed(2)}ms`);
           
-          if (!results || results.length === 0) {
+          if (!result) {
             throw new Error('No results returned from Python script');
           }
           
-          const result = results[0];
           console.log(`[${new Date().toISOString()}] PYTHON RESULT: ${JSON.stringify(result)}`);
           
           if (!result.success) {
@@ -201,6 +298,7 @@ router.post('/recommend', async (req, res) => {
             topRecommendation: result.predictedCrop,
             recommendations: enrichedRecommendations,
             source: result.source || 'model', // Indicates if it's from ML model or rule-based
+            cached: result.cached === true, // Served from the Python prediction cache
             processingTime: {
               total: (performance.now() - requestStartTime).toFixed(2) + 'ms',
               model: modelDuration.toFixed(2) + 'ms'
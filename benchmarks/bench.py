@@ -0,0 +1,492 @@
+"""Benchmarks for the Python hot paths of AgroBoost.
+
+Each benchmark runs in a fresh interpreter, so cold starts and peak RSS are
+measured per benchmark. Everything runs offline on the CPU: /api/signup talks
+to a local fake Gemini client with a configurable latency.
+
+    python benchmarks/bench.py run --output results.json
+    python benchmarks/bench.py run --only crop_warm_single schemes
+    python benchmarks/bench.py compare baseline.json results.json --threshold 0.15
+
+The crop benchmarks honour CROP_MODEL_ENGINE, so engines can be compared by
+running the suite once per engine. Those that time the model need its
+metadata (see backend/models/model_meta.py) and fail without it.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_MODELS = ROOT / 'backend' / 'models'
+AI_DIR = ROOT / 'AI'
+
+BENCHMARKS = {}
+
+# Filter combinations sent to /api/schemes, from unfiltered to every filter set
+SCHEME_QUERIES = [
+    '',
+    'state=assam',
+    'category=irrigation',
+    'gender=female&income=low',
+    'state=kerala&category=farmer support&income=middle&gender=male',
+]
+
+
+def benchmark(name, description):
+    def register(fn):
+        BENCHMARKS[name] = (fn, description)
+        return fn
+    return register
+
+
+def crop_inputs(count, seed):
+    """Return ``count`` plausible agronomic input rows."""
+    rng = random.Random(seed)
+    return [
+        (rng.uniform(0, 140), rng.uniform(5, 145), rng.uniform(5, 205), rng.uniform(8, 44),
+         rng.uniform(14, 100), rng.uniform(3.5, 9.9), rng.uniform(20, 300))
+        for _ in range(count)
+    ]
+
+
+def _import_crop_recommender():
+    sys.path.insert(0, str(BACKEND_MODELS))
+    import crop_recommender
+    return crop_recommender
+
+
+def _loaded_model(cr):
+    # Timing the rule-based fallback under a model benchmark's name would be misleading
+    model = cr.get_model()
+    if model is None:
+        raise RuntimeError("Crop model could not be loaded (is CROP_MODEL_META set?)")
+    return model
+
+
+def _import_ai_app():
+    sys.path.insert(0, str(AI_DIR))
+    os.chdir(AI_DIR)
+    from app import app
+    return app
+
+
+def _timed(fn, iterations, warmup=0):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+@benchmark('crop_cold', "predict_crop including the model load, per fresh model")
+def bench_crop_cold(options):
+    os.environ['CROP_CACHE_SIZE'] = '0'
+    os.environ.pop('CROP_LOOKUP_GRID', None)
+    started = time.perf_counter()
+    cr = _import_crop_recommender()
+    import_seconds = time.perf_counter() - started
+
+    row = crop_inputs(1, options.seed)[0]
+    samples = []
+    for _ in range(options.cold_runs):
+        cr._model = None
+        cr._model_loaded = False
+        started = time.perf_counter()
+        cr.predict_crop(*row)
+        samples.append(time.perf_counter() - started)
+    return samples, 1, {'import_ms': round(import_seconds * 1000, 3)}
+
+
+@benchmark('crop_warm_single', "predict_crop on a loaded model, cache disabled")
+def bench_crop_warm_single(options):
+    os.environ['CROP_CACHE_SIZE'] = '0'
+    os.environ.pop('CROP_LOOKUP_GRID', None)
+    cr = _import_crop_recommender()
+    _loaded_model(cr)
+    rows = iter(crop_inputs(options.iterations + 10, options.seed))
+    return _timed(lambda: cr.predict_crop(*next(rows)), options.iterations, warmup=10), 1, {}
+
+
+@benchmark('crop_warm_cached', "predict_crop answered from the prediction cache")
+def bench_crop_warm_cached(options):
+    os.environ['CROP_CACHE_SIZE'] = '4096'
+    os.environ.pop('CROP_LOOKUP_GRID', None)
+    os.environ.pop('CROP_CACHE_PATH', None)
+    cr = _import_crop_recommender()
+    row = crop_inputs(1, options.seed)[0]
+    return _timed(lambda: cr.predict_crop(*row), options.iterations, warmup=10), 1, {}
+
+
+@benchmark('crop_lookup', "predict_crop answered from the lookup grid, cache disabled")
+def bench_crop_lookup(options):
+    os.environ['CROP_CACHE_SIZE'] = '0'
+    workdir = None
+    if not os.environ.get('CROP_LOOKUP_GRID'):
+        # Without a prebuilt grid, time a coarse one built from the loaded model
+        workdir = tempfile.TemporaryDirectory(prefix='bench-grid-')
+        os.environ['CROP_LOOKUP_GRID'] = workdir.name
+    cr = _import_crop_recommender()
+    if workdir is not None:
+        import lookup_grid
+        model = _loaded_model(cr)
+        axes = [dict(axis, points=5) for axis in lookup_grid.grid_axes(model)]
+        lookup_grid.build_grid(model, axes, workdir.name)
+    grid = cr.get_grid()
+    rows = iter(crop_inputs(options.iterations + 10, options.seed))
+    samples = _timed(lambda: cr.predict_crop(*next(rows)), options.iterations, warmup=10)
+    return samples, 1, {'cells': len(grid.classes), 'hit_rate': grid.stats()['hitRate']}
+
+
+@benchmark('crop_batch', "predict_crops_batch over --batch-size rows")
+def bench_crop_batch(options):
+    cr = _import_crop_recommender()
+    model = _loaded_model(cr)
+    rows = crop_inputs(options.batch_size, options.seed)
+    iterations = max(options.iterations // 20, 5)
+    samples = _timed(lambda: cr.predict_crops_batch(rows, model=model), iterations, warmup=1)
+    return samples, options.batch_size, {'batch_size': options.batch_size}
+
+
+@benchmark('crop_explain_single', "predict_crop with explanations on a loaded model, cache disabled")
+def bench_crop_explain_single(options):
+    os.environ['CROP_CACHE_SIZE'] = '0'
+    cr = _import_crop_recommender()
+    model = _loaded_model(cr)
+    started = time.perf_counter()
+    explainer = cr.get_explainer(model)
+    build_ms = (time.perf_counter() - started) * 1000
+    rows = iter(crop_inputs(options.iterations + 10, options.seed))
+    samples = _timed(lambda: cr.predict_crop(*next(rows), explain=True), options.iterations, warmup=10)
+    return samples, 1, {'build_ms': round(build_ms, 3), 'table_mb': round(explainer.nbytes / 1e6, 1)}
+
+
+@benchmark('crop_explain_batch', "explain_crops_batch over --batch-size rows")
+def bench_crop_explain_batch(options):
+    cr = _import_crop_recommender()
+    model = _loaded_model(cr)
+    cr.get_explainer(model)
+    rows = crop_inputs(options.batch_size, options.seed)
+    iterations = max(options.iterations // 20, 5)
+    samples = _timed(lambda: cr.explain_crops_batch(rows, model=model), iterations, warmup=1)
+    return samples, options.batch_size, {'batch_size': options.batch_size}
+
+
+@benchmark('rule_based', "get_rule_based_recommendations")
+def bench_rule_based(options):
+    cr = _import_crop_recommender()
+    rows = crop_inputs(options.iterations, options.seed)
+    rows_iter = iter(rows * 2)
+    return _timed(lambda: cr.get_rule_based_recommendations(*next(rows_iter)), options.iterations, warmup=10), 1, {}
+
+
+@benchmark('schemes', "GET /api/schemes over several filter combinations")
+def bench_schemes(options):
+    client = _import_ai_app().test_client()
+    urls = iter(['/api/schemes?' + SCHEME_QUERIES[i % len(SCHEME_QUERIES)]
+                 for i in range(options.iterations + len(SCHEME_QUERIES))])
+
+    def request():
+        response = client.get(next(urls))
+        assert response.status_code == 200, response.status_code
+
+    return _timed(request, options.iterations, warmup=len(SCHEME_QUERIES)), 1, {'queries': SCHEME_QUERIES}
+
+
+class _FakeModels:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, model, contents, config):
+        time.sleep(self.latency)
+
+        class Response:
+            text = '[{"name": "Test User", "aadharID": "0000 0000 0000", "dob": "01/01/2000", "location": "Pune"}]'
+        return Response()
+
+
+class _FakeClient:
+    def __init__(self, latency):
+        self.models = _FakeModels(latency)
+
+
+def _sample_jpeg(seed, size=(2000, 1500)):
+    import PIL.Image
+    rng = random.Random(seed)
+    # Random blocks so the JPEG is not trivially compressible, like a photo
+    image = PIL.Image.new('RGB', size)
+    for x in range(0, size[0], 50):
+        for y in range(0, size[1], 50):
+            image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, x + 50, y + 50))
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+@benchmark('signup', "POST /api/signup with a fake Gemini client (--fake-latency-ms)")
+def bench_signup(options):
+    os.environ['EXTRACTION_CACHE_SIZE'] = '0'
+    client = _import_ai_app().test_client()
+    from models import model
+    model.set_client(_FakeClient(options.fake_latency_ms / 1000))
+    image = _sample_jpeg(options.seed)
+
+    def request():
+        response = client.post('/api/signup', data={'aadhaarImage': (io.BytesIO(image), 'aadhaar.jpg')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200, response.status_code
+
+    iterations = max(options.iterations // 10, 5)
+    samples = _timed(request, iterations, warmup=2)
+    return samples, 1, {'fake_latency_ms': options.fake_latency_ms, 'image_bytes': len(image)}
+
+
+def _log_under_load(options, configure):
+    """Time logging calls made from --threads threads at once, as request threads would."""
+    import logging
+    sys.path.insert(0, str(AI_DIR))
+    workdir = tempfile.TemporaryDirectory(prefix='bench-logging-')
+    os.chdir(workdir.name)
+    configure()
+    logger = logging.getLogger('bench')
+    payload = json.dumps({"name": "Test User", "location": "Pune", "padding": "x" * 400})
+    per_thread = options.iterations * 10
+    samples = [[] for _ in range(options.threads)]
+
+    def worker(own):
+        for i in range(per_thread):
+            started = time.perf_counter()
+            logger.info("Signup stages (ms): model=%.1f, result %s", i * 0.1, payload)
+            own.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(samples[i],)) for i in range(options.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    logging.shutdown()
+    os.chdir(ROOT)
+    workdir.cleanup()
+    total = per_thread * options.threads
+    return [sample for own in samples for sample in own], 1, {
+        'threads': options.threads,
+        # Calls per second across all threads, not per caller
+        'throughput_per_s': round(total / wall, 2),
+    }
+
+
+@benchmark('logging_sync', "logging from --threads threads with synchronous JSON file and console handlers")
+def bench_logging_sync(options):
+    def configure():
+        import logging
+        from logging.handlers import RotatingFileHandler
+        from utilities.logging_setup import JsonFormatter, RequestIdFilter
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        for handler in (logging.StreamHandler(sys.stderr), RotatingFileHandler('bench.log', maxBytes=10 * 1024 * 1024)):
+            handler.setFormatter(JsonFormatter())
+            handler.addFilter(RequestIdFilter())
+            root.addHandler(handler)
+    return _log_under_load(options, configure)
+
+
+@benchmark('logging_queue', "logging from --threads threads through the queue and background listener")
+def bench_logging_queue(options):
+    def configure():
+        from utilities.logging_setup import configure_logging
+        # A queue large enough that nothing is dropped, to compare like with like
+        configure_logging(log_file='bench.log', queue_size=options.iterations * 10 * options.threads + 1)
+    return _log_under_load(options, configure)
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples, items_per_sample):
+    ordered = sorted(samples)
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(total / len(samples) * 1000, 4),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+        'throughput_per_s': round(len(samples) * items_per_sample / total, 2) if total else 0.0,
+    }
+
+
+def run_child(name, options):
+    """Run one benchmark in this process and print its raw result as JSON."""
+    import resource
+
+    fn, _ = BENCHMARKS[name]
+    samples, items, extra = fn(options)
+    result = summarize(samples, items)
+    result.update(extra)
+    # ru_maxrss is in kilobytes on Linux
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    sys.__stdout__.write(json.dumps(result) + '\n')
+
+
+def run_benchmark(name, options):
+    command = [sys.executable, os.path.abspath(__file__), '_child', name,
+               '--iterations', str(options.iterations), '--batch-size', str(options.batch_size),
+               '--cold-runs', str(options.cold_runs), '--fake-latency-ms', str(options.fake_latency_ms),
+               '--threads', str(options.threads), '--seed', str(options.seed)]
+    # The code under test logs to stderr on every call; keep it out of the report
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=stderr, cwd=ROOT)
+        if process.returncode != 0:
+            stderr.seek(0)
+            tail = stderr.read().decode('utf-8', 'replace')[-2000:]
+            raise RuntimeError(f"Benchmark {name} failed with exit code {process.returncode}:\n{tail}")
+    return json.loads(process.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options):
+    names = options.only or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'crop_model_engine': os.environ.get('CROP_MODEL_ENGINE', 'sklearn'),
+            'crop_model_meta': os.environ.get('CROP_MODEL_META'),
+            'iterations': options.iterations,
+        },
+        'benchmarks': {},
+    }
+    for name in names:
+        result = run_benchmark(name, options)
+        report['benchmarks'][name] = result
+        print(f"{name:<18} p50 {result['p50_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms  "
+              f"p99 {result['p99_ms']:>10.3f} ms  {result['throughput_per_s']:>10.1f}/s  "
+              f"rss {result['peak_rss_mb']:>7.1f} MB", file=sys.stderr)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if options.compare:
+        with open(options.compare) as f:
+            return compare(json.load(f), report, options.threshold, options.rss_threshold)
+    return 0
+
+
+def compare(baseline, current, threshold=0.10, rss_threshold=0.20):
+    """Print a comparison table and return 1 if any benchmark regressed past the thresholds.
+
+    Latency regresses when p50 or p95 grows by more than ``threshold``,
+    throughput when it drops by more than ``threshold`` and memory when peak
+    RSS grows by more than ``rss_threshold``.
+    """
+    # (metric, higher is better, allowed relative change)
+    checks = [('p50_ms', False, threshold), ('p95_ms', False, threshold),
+              ('throughput_per_s', True, threshold), ('peak_rss_mb', False, rss_threshold)]
+    regressions = []
+    for name, result in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            print(f"{name:<18} (no baseline)")
+            continue
+        cells = []
+        for metric, higher_is_better, allowed in checks:
+            if not base.get(metric):
+                continue
+            change = result[metric] / base[metric] - 1
+            regressed = (-change if higher_is_better else change) > allowed
+            if regressed:
+                regressions.append(f"{name}.{metric}")
+            cells.append(f"{metric} {change:+7.1%}{' !' if regressed else '  '}")
+        print(f"{name:<18} " + "  ".join(cells))
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Python hot paths of AgroBoost")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_run_options(subparser):
+        subparser.add_argument('--iterations', type=int, default=200,
+                               help="timed iterations for the fast benchmarks; slower ones use a fraction")
+        subparser.add_argument('--batch-size', type=int, default=1000, help="rows per crop_batch call")
+        subparser.add_argument('--cold-runs', type=int, default=5, help="model loads timed by crop_cold")
+        subparser.add_argument('--fake-latency-ms', type=float, default=50, help="latency of the fake Gemini client")
+        subparser.add_argument('--threads', type=int, default=8, help="concurrent callers for the logging benchmarks")
+        subparser.add_argument('--seed', type=int, default=42)
+
+    run_parser = subparsers.add_parser('run', help="run benchmarks and report the results")
+    add_run_options(run_parser)
+    run_parser.add_argument('--only', nargs='+', metavar='NAME', help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    run_parser.add_argument('--output', help="write the JSON results here instead of stdout")
+    run_parser.add_argument('--compare', metavar='BASELINE', help="compare against a stored results file")
+    run_parser.add_argument('--threshold', type=float, default=0.10, help="allowed latency/throughput change")
+    run_parser.add_argument('--rss-threshold', type=float, default=0.20, help="allowed peak RSS growth")
+
+    compare_parser = subparsers.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help="allowed latency/throughput change")
+    compare_parser.add_argument('--rss-threshold', type=float, default=0.20, help="allowed peak RSS growth")
+
+    child_parser = subparsers.add_parser('_child')
+    child_parser.add_argument('name', choices=list(BENCHMARKS))
+    add_run_options(child_parser)
+
+    options = parser.parse_args(argv)
+    if options.command == '_child':
+        run_child(options.name, options)
+        return 0
+    if options.command == 'compare':
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        with open(options.current) as f:
+            current = json.load(f)
+        return compare(baseline, current, options.threshold, options.rss_threshold)
+    return run(options)
+
+
+if __name__ == '__main__':
+    sys.exit(main())